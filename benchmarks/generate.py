@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+"""
+Generator of synthetic C++ sources for the PyClASVi benchmarks.
+
+Each shape stresses a different part of PyClASVi, size controls how big the input gets.
+The output only depends on shape and size, so results of different runs are comparable.
+
+Enter 'generate.py -h' to show the usage
+"""
+
+import argparse
+import os
+
+
+# Deep AST: a long chain of binary operators (one level per term)
+# and nested blocks inside a function.
+def gen_deep(size):
+    lines = ['int deep_chain(int x)', '{']
+    lines.append('    int r = x' + ' + x' * size + ';')
+    nesting = min(size, 200)    # Clang limits the bracket depth to 256
+    for n in range(nesting):
+        lines.append('    ' * (n + 1) + 'if (r > {0}) {{'.format(n))
+        lines.append('    ' * (n + 2) + 'r -= {0};'.format(n))
+    for n in reversed(range(nesting)):
+        lines.append('    ' * (n + 1) + '}')
+    lines.append('    return r;')
+    lines.append('}')
+    return {'main.cpp': '\n'.join(lines) + '\n'}
+
+
+# Wide AST: many declarations at the same level in a few namespaces.
+def gen_wide(size):
+    lines = []
+    for ns in range(4):
+        lines.append('namespace wide_{0} {{'.format(ns))
+        for n in range(size):
+            lines.append('struct S{0} {{ int a; double b; int get() const {{ return a; }} }};'.format(n))
+            lines.append('int f{0}(int p) {{ return p * {0}; }}'.format(n))
+            lines.append('static const int c{0} = {0};'.format(n))
+        lines.append('}')
+    return {'main.cpp': '\n'.join(lines) + '\n'}
+
+
+# Heavy templates: recursive template instantiation and many instantiations
+# of class and function templates.
+def gen_templates(size):
+    depth = min(size, 500)      # below default template instantiation depth
+    lines = [
+        'template<int N> struct Sum { static const int value = N + Sum<N - 1>::value; };',
+        'template<> struct Sum<0> { static const int value = 0; };',
+        'template<typename T, int I> struct Holder {',
+        '    T data[I + 1];',
+        '    template<typename U> U convert(U u) const { return u + static_cast<U>(data[0]); }',
+        '    T first() const { return data[0]; }',
+        '};',
+        'template<typename T> T twice(T t) { return t + t; }',
+        'int templates_main() {',
+        '    int r = Sum<{0}>::value;'.format(depth),
+        ]
+    types = ('int', 'long', 'short', 'double', 'float', 'char', 'unsigned', 'long long')
+    for n in range(size):
+        t = types[n % len(types)]
+        lines.append('    Holder<{0}, {1}> h{1} = {{}};'.format(t, n))
+        lines.append('    r += static_cast<int>(h{0}.convert<{1}>(twice<{1}>(h{0}.first())));'.format(n, t))
+    lines.append('    return r;')
+    lines.append('}')
+    return {'main.cpp': '\n'.join(lines) + '\n'}
+
+
+# Many diagnostics: several warnings per function, use it with -Wall -Wextra.
+def gen_diagnostics(size):
+    lines = []
+    for n in range(size):
+        lines.append('int diag{0}(int a, unsigned b) {{'.format(n))
+        lines.append('    int unused{0};'.format(n))
+        lines.append('    if (a = {0}) {{ }}'.format(n))
+        lines.append('    if (a < b) { return a; }')
+        lines.append('}')
+    return {'main.cpp': '\n'.join(lines) + '\n'}
+
+
+# Large include fan-out: the main file includes many headers,
+# each header includes a shared one and declares some functions and a class.
+def gen_includes(size):
+    files = {'common.hpp': '#pragma once\nstruct Common { int id; };\n'}
+    mainLines = []
+    for n in range(size):
+        name = 'header_{0}.hpp'.format(n)
+        files[name] = '\n'.join([
+            '#pragma once',
+            '#include "common.hpp"',
+            'struct C{0} : Common {{ int value() const {{ return id + {0}; }} }};'.format(n),
+            'int h{0}_a(int x);'.format(n),
+            'inline int h{0}_b(int x) {{ return x * {0}; }}'.format(n),
+            ]) + '\n'
+        mainLines.append('#include "{0}"'.format(name))
+    mainLines.append('int includes_main() {')
+    mainLines.append('    int r = 0;')
+    for n in range(size):
+        mainLines.append('    r += C{0}().value() + h{0}_b(r);'.format(n))
+    mainLines.append('    return r;')
+    mainLines.append('}')
+    files['main.cpp'] = '\n'.join(mainLines) + '\n'
+    return files
+
+
+# Many doubles: structs and enums declared together with several variables,
+# the declaration is a child of each variable.
+def gen_doubles(size):
+    lines = []
+    for n in range(size):
+        lines.append('struct D{0} {{'.format(n))
+        for m in range(8):
+            lines.append('    int m{0};'.format(m))
+        lines.append('    int sum() const { return m0 + m1 + m2 + m3 + m4 + m5 + m6 + m7; }')
+        lines.append('}} d{0}a, d{0}b, d{0}c, d{0}d;'.format(n))
+        lines.append('enum F{0} {{ F{0}_A, F{0}_B, F{0}_C }} f{0}a, f{0}b;'.format(n))
+    return {'main.cpp': '\n'.join(lines) + '\n'}
+
+
+# name -> (generator function, default size, extra clang arguments)
+SHAPES = {
+    'deep': (gen_deep, 2000, []),
+    'wide': (gen_wide, 500, []),
+    'templates': (gen_templates, 300, []),
+    'diagnostics': (gen_diagnostics, 1000, ['-Wall', '-Wextra']),
+    'includes': (gen_includes, 300, []),
+    'doubles': (gen_doubles, 500, []),
+    }
+
+SHAPE_ORDER = ('deep', 'wide', 'templates', 'diagnostics', 'includes', 'doubles')
+
+
+# Write all files of shape with size to directory.
+# Return tuple (path of main file, list of clang arguments).
+def generate(shape, size, directory):
+    func, defaultSize, extraArgs = SHAPES[shape]
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    for name, content in func(size).items():
+        with open(os.path.join(directory, name), 'w') as f:
+            f.write(content)
+    args = ['-xc++', '-std=c++11', '-I' + directory] + extraArgs
+    return (os.path.join(directory, 'main.cpp'), args)
+
+
+# Write an input file as used by PyClASVi ([Load] button or command line).
+def write_input_file(fileName, args, inputFile):
+    with open(inputFile, 'w') as f:
+        f.write(fileName + '\n')
+        for arg in args:
+            f.write(arg + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic C++ sources for PyClASVi benchmarks')
+    parser.add_argument('shape', help='shape of generated source', choices=SHAPE_ORDER)
+    parser.add_argument('directory', help='output directory, one input file input.txt is also created')
+    parser.add_argument('-s', '--size', help='size of source, default depends on shape', type=int)
+    args = parser.parse_args()
+
+    size = args.size
+    if size is None:
+        size = SHAPES[args.shape][1]
+    fileName, clangArgs = generate(args.shape, size, args.directory)
+    write_input_file(fileName, clangArgs, os.path.join(args.directory, 'input.txt'))
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+
+"""
+Benchmarks for the hot paths of PyClASVi using synthetic sources (see generate.py).
+
+For each shape the source is generated, parsed and all phases are timed without user interaction.
+Phases using Tk widgets need a display but no window is shown, without display they are skipped.
+The results are written as JSON, so runs of different commits or libclang versions can be compared.
+
+Enter 'run_benchmarks.py -h' to show the usage
+"""
+
+import sys
+import os
+import argparse
+import json
+import collections
+import platform
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import clang.cindex
+import pyclasvi
+import generate
+
+timer = getattr(time, 'perf_counter', time.time)
+
+
+# Call func repeat times, return timing as dictionary.
+def time_runs(func, repeat):
+    times = []
+    result = None
+    for n in range(repeat):
+        startTime = timer()
+        result = func()
+        times.append(timer() - startTime)
+    return (collections.OrderedDict((('runs', repeat),
+                                     ('min', min(times)),
+                                     ('mean', sum(times) / repeat),
+                                     ('total', sum(times)))),
+            result)
+
+
+# Call func once for each item, return timing of all calls as dictionary.
+def time_each(func, items):
+    times = []
+    for item in items:
+        startTime = timer()
+        func(item)
+        times.append(timer() - startTime)
+    if not times:
+        return None
+    return collections.OrderedDict((('runs', len(times)),
+                                    ('min', min(times)),
+                                    ('mean', sum(times) / len(times)),
+                                    ('max', max(times)),
+                                    ('total', sum(times))))
+
+
+# Return up to cnt node ids of declarations in cursorTree located in fileName, equally distributed.
+# Only declarations are used because reading tls_kind of other cursors crashes some libclang versions.
+def sample_nodes(cursorTree, fileName, cnt):
+    nodes = []
+    for node in range(1, cursorTree.cntCursors):
+        cursor = cursorTree.get_cursor(node)
+        loc = cursor.location
+        if loc.file and (pyclasvi.toStr(loc.file.name) == fileName) and cursor.kind.is_declaration():
+            nodes.append(node)
+    step = max(1, len(nodes) // cnt)
+    return nodes[::step][:cnt]
+
+
+# Searches done for each shape: kwargs of ASTOutputFrame.search.
+SEARCHES = (
+    {'use_CursorKind': 0, 'CursorKind': '', 'spelling': 'main',
+     'caseInsensitive': 0, 'use_RexEx': 0},
+    {'use_CursorKind': 0, 'CursorKind': '', 'spelling': 'MAIN',
+     'caseInsensitive': 1, 'use_RexEx': 0},
+    {'use_CursorKind': 0, 'CursorKind': '', 'spelling': '.*1.*',
+     'caseInsensitive': 0, 'use_RexEx': 1},
+    {'use_CursorKind': 1, 'CursorKind': 'FUNCTION_DECL', 'spelling': '',
+     'caseInsensitive': 0, 'use_RexEx': 1},
+    )
+
+
+# Phases without Tk widgets.
+def bench_core(fileName, args, repeat, sampleCnt, case):
+    phases = case['phases']
+    index = clang.cindex.Index.create()
+
+    phases['parse'], tu = time_runs(lambda: index.parse(fileName, args=args), repeat)
+    phases['diagnostics'], diagnostics = time_runs(lambda: list(tu.diagnostics), repeat)
+
+    def walk():
+        cursorTree = pyclasvi.CursorTree()
+        cursorTree.walk(tu)
+        return cursorTree
+    phases['walk'], cursorTree = time_runs(walk, repeat)
+
+    def search():
+        for kwargs in SEARCHES:
+            reObj = None
+            if kwargs['use_RexEx']:
+                reObj = re.compile(kwargs['spelling'], re.IGNORECASE if kwargs['caseInsensitive'] else 0)
+            cursorKind = kwargs['CursorKind'] if kwargs['use_CursorKind'] else None
+            cursorTree.search(kwargs['spelling'], kwargs['caseInsensitive'], reObj, cursorKind)
+    phases['search'] = time_runs(search, repeat)[0]
+
+    nodes = sample_nodes(cursorTree, fileName, sampleCnt)
+    def load_tokens():
+        tokenTable = pyclasvi.TokenTable(tu, fileName)
+        for node in nodes:
+            extent = cursorTree.get_cursor(node).extent
+            tokenTable.find_range(extent.start.offset, extent.end.offset)
+        return tokenTable
+    phases['token load'], tokenTable = time_runs(load_tokens, repeat)
+
+    case['cursors'] = cursorTree.cntCursors
+    case['doubles'] = cursorTree.cntDouble
+    case['max depth'] = cursorTree.cntMaxDeep
+    case['tokens'] = len(tokenTable)
+    case['diagnostics'] = len(diagnostics)
+    return (tu, diagnostics, cursorTree, nodes)
+
+
+# Phases using Tk widgets, root is a hidden Tk window.
+def bench_gui(root, tu, diagnostics, cursorTree, nodes, repeat, case):
+    phases = case['phases']
+
+    astFrame = pyclasvi.ASTOutputFrame(root, lazy=False)
+    def insert_all():
+        astFrame.set_translationunit(tu, cursorTree)
+        while astFrame.insertJobs:
+            root.update_idletasks()
+    phases['treeview insert'] = time_runs(insert_all, repeat)[0]
+    phases['search (ASTOutputFrame)'] = time_runs(
+        lambda: [astFrame.search(**kwargs) for kwargs in SEARCHES], repeat)[0]
+    astFrame.clear()
+    astFrame.destroy()
+
+    cursorFrame = pyclasvi.CursorOutputFrame(root)
+    cursors = [cursorTree.get_cursor(node) for node in nodes]
+    phases['cursor render'] = time_each(cursorFrame.set_cursor, cursors)
+    cursorFrame.destroy()
+
+    fileFrame = pyclasvi.CursorFileOutputFrame(root)
+    phases['token load (CursorFileOutputFrame)'] = time_each(fileFrame.set_cursor, cursors)
+    fileFrame.destroy()
+
+    errorFrame = pyclasvi.ErrorFrame(root)
+    phases['error set'] = time_runs(lambda: errorFrame.set_errors(diagnostics), repeat)[0]
+    def filter_all():
+        for level in reversed(pyclasvi.ErrorFrame._DIAG_STR_TAB):
+            errorFrame.filterValue.set(level)
+            errorFrame._filter()
+    phases['error filter'] = time_runs(filter_all, repeat)[0]
+    errorFrame.destroy()
+
+
+def get_commit():
+    try:
+        out = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=BENCH_DIR,
+                                      stderr=subprocess.STDOUT)
+        return out.decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks for PyClASVi')
+    parser.add_argument('-l', '--libfile', help='select Clang library file', dest='libFile')
+    parser.add_argument('-o', '--output', help='write JSON result to OUTFILE instead of stdout',
+                        dest='outFile')
+    parser.add_argument('--shapes', help='''comma separated list of shapes,
+                        default is all: {0}'''.format(','.join(generate.SHAPE_ORDER)))
+    parser.add_argument('--scale', help='multiply the default size of all shapes by SCALE, default is 1.0',
+                        type=float, default=1.0)
+    parser.add_argument('--repeat', help='number of runs per phase, default is 3', type=int, default=3)
+    parser.add_argument('--samples', help='''number of cursors to render and load tokens for,
+                        default is 100''', type=int, default=100)
+    parser.add_argument('--work-dir', help='''directory for generated sources,
+                        default is a temporary directory removed at exit''', dest='workDir')
+    parser.add_argument('--no-gui', help='skip all phases using Tk widgets', action='store_true',
+                        dest='noGui')
+    args = parser.parse_args()
+
+    if args.libFile:
+        clang.cindex.Config.set_library_file(args.libFile)
+
+    shapes = generate.SHAPE_ORDER
+    if args.shapes:
+        shapes = args.shapes.split(',')
+        for shape in shapes:
+            if shape not in generate.SHAPES:
+                parser.error('unknown shape: ' + shape)
+
+    root = None
+    guiInfo = 'disabled by --no-gui'
+    if not args.noGui:
+        try:
+            root = pyclasvi.tk.Tk()
+            root.withdraw()
+            guiInfo = 'enabled'
+        except pyclasvi.tk.TclError as e:
+            guiInfo = 'skipped: ' + str(e)
+
+    workDir = args.workDir or tempfile.mkdtemp(prefix='pyclasvi_bench_')
+    result = collections.OrderedDict()
+    result['info'] = collections.OrderedDict((
+        ('commit', get_commit()),
+        ('libclang', pyclasvi.get_libclang_version()),
+        ('python', platform.python_version()),
+        ('platform', platform.platform()),
+        ('date', time.strftime('%Y-%m-%dT%H:%M:%S')),
+        ('scale', args.scale),
+        ('repeat', args.repeat),
+        ('gui', guiInfo),
+        ))
+    result['cases'] = []
+    try:
+        for shape in shapes:
+            size = max(1, int(generate.SHAPES[shape][1] * args.scale))
+            fileName, clangArgs = generate.generate(shape, size, os.path.join(workDir, shape))
+            case = collections.OrderedDict((('shape', shape), ('size', size), ('args', clangArgs)))
+            case['phases'] = collections.OrderedDict()
+            tu, diagnostics, cursorTree, nodes = bench_core(fileName, clangArgs, args.repeat,
+                                                            args.samples, case)
+            if root is not None:
+                bench_gui(root, tu, diagnostics, cursorTree, nodes, args.repeat, case)
+            result['cases'].append(case)
+            sys.stderr.write('{0}: {1} cursors, parse {2:.3f} s, walk {3:.3f} s\n'.format(
+                shape, case['cursors'], case['phases']['parse']['min'], case['phases']['walk']['min']))
+    finally:
+        if root is not None:
+            root.destroy()
+        if not args.workDir:
+            shutil.rmtree(workDir, ignore_errors=True)
+
+    if args.outFile:
+        with open(args.outFile, 'w') as f:
+            json.dump(result, f, indent=2)
+            f.write('\n')
+    else:
+        json.dump(result, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+
+if __name__ == '__main__':
+  main()
@@ -10,6 +10,9 @@ Enter 'pyclasvi.py -h' to show the usage
 PyClASVi is distributed under the MIT License, see LICENSE file.
 """
 
+import time
+STARTUP_TIME = time.time()  # start of import, used by --startup-profile
+
 import sys
 
 if sys.version_info.major == 2:
@@ -18,18 +21,29 @@ if sys.version_info.major == 2:
     import tkFont
     import tkFileDialog
     import tkMessageBox
+    import Queue as queue
 else: # python3
     import tkinter.ttk as ttk
     import tkinter as tk
     import tkinter.font as tkFont
     import tkinter.filedialog as tkFileDialog
     import tkinter.messagebox as tkMessageBox
+    import queue
 
 import clang.cindex
 import ctypes
 import argparse
-import inspect
 import re
+import threading
+import json
+import collections
+import os
+import array
+import bisect
+import fnmatch
+# inspect and hashlib are only imported when needed, they take a noticeable part of the start time
+
+IMPORT_TIME = time.time()   # end of import, used by --startup-profile
 
 
 # Convert objects to a string.
@@ -66,17 +80,25 @@ def xjoin(*args):
 
 # check if m is an instance methode
 def is_instance_methode(m):
+    import inspect
     return inspect.ismethod(m)
 
 
 # has this instance methode only the self parameter?
 def is_simple_instance_methode(m):
-    argSpec = inspect.getargspec(m)
+    import inspect
+    if hasattr(inspect, 'getfullargspec'): # Python 3, getargspec is removed since 3.11
+        argSpec = inspect.getfullargspec(m)
+    else:
+        argSpec = inspect.getargspec(m)
     return len(argSpec.args) == 1 # only self
 
 
-# get methode definition like "(arg1, arg2)" as string
+# get methode definition like "(self, arg1, arg2)" as string
 def get_methode_prototype(m):
+    import inspect
+    if hasattr(inspect, 'signature'): # Python 3, formatargspec is removed since 3.11
+        return str(inspect.signature(getattr(m, '__func__', m)))
     argSpec = inspect.getargspec(m)
     return inspect.formatargspec(*argSpec)
 
@@ -90,23 +112,726 @@ def is_obj_in_stack(obj, objStack):
     return False
 
 
-# Cursor objects have a hash property but no __hash__ method
-# You can use this class to make Cursor object hashable
-class HashableObj:
-    def __init__(self, obj):
-        self.obj = obj
+# Get parts of a regular expression (as lower case) every matching string must contain.
+# This is just a simple conservative scan, literals in groups or followed by an optional
+# quantifier are skipped. There is no result for patterns with alternatives (|).
+def get_regex_literals(pattern):
+    if '|' in pattern:
+        return []
+    literals = []
+    curLiteral = []
+    deep = 0 # group deep
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        lit = None
+        i += 1
+        if c == '\\':
+            if (i < len(pattern)) and not pattern[i].isalnum():
+                lit = pattern[i]    # escaped special character, not a sequence like \d
+            i += 1
+        elif c == '[': # skip character class
+            if (i < len(pattern)) and (pattern[i] == '^'):
+                i += 1
+            if (i < len(pattern)) and (pattern[i] == ']'):
+                i += 1
+            while (i < len(pattern)) and (pattern[i] != ']'):
+                if pattern[i] == '\\':
+                    i += 1
+                i += 1
+            i += 1
+        elif c == '{': # skip quantifier
+            while (i < len(pattern)) and (pattern[i] != '}'):
+                i += 1
+            i += 1
+        elif c == '(':
+            deep += 1
+        elif c == ')':
+            deep -= 1
+        elif c not in '.^$*+?}':
+            lit = c
+
+        if (i < len(pattern)) and (pattern[i] in '*?{'):
+            lit = None                  # optional, so may be not in matching string
+        if (lit is not None) and (deep == 0):
+            curLiteral.append(lit)
+            if (i < len(pattern)) and (pattern[i] == '+'):
+                lit = None              # end literal, repeated characters may follow
+        if (lit is None) or (deep != 0):
+            if curLiteral:
+                literals.append(''.join(curLiteral).lower())
+            curLiteral = []
+    if curLiteral:
+        literals.append(''.join(curLiteral).lower())
+    return literals
+
+
+_cursorKindNames = None
+
+# Return sorted list of names of all cursor kinds, it's created only once.
+def get_cursor_kind_names():
+    global _cursorKindNames
+    if _cursorKindNames is None:
+        _cursorKindNames = sorted(kind.name for kind in clang.cindex.CursorKind.get_all_kinds())
+    return _cursorKindNames
+
+
+# Get a set of all substrings of text with length 3.
+def get_trigrams(text):
+    return set(text[i:i+3] for i in range(len(text)-2))
+
+
+# Return version string of used libclang or None if not available.
+def get_libclang_version():
+    try:
+        func = clang.cindex.conf.lib.clang_getClangVersion
+        func.restype = clang.cindex._CXString
+        return toStr(clang.cindex._CXString.from_result(func(), func, ()))
+    except Exception:
+        return None
+
+
+# Write time since start of import with name and extra text to stderr, used by --startup-profile.
+def print_startup_time(name, extra=''):
+    sys.stderr.write('startup: {0} {1:.1f} ms{2}\n'.format(name, (time.time() - STARTUP_TIME) * 1000.0,
+                                                          extra))
+
+
+# Wall time and counts recorded for the phases of parsing and showing a translation unit.
+# A phase may run several times (e.g. rendering the cursor output), so the number of runs,
+# the total and the max time of a single run are recorded.
+# Counts are named numbers like the number of cursors.
+# Phases are also recorded by the parse thread, so all access is locked.
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.phases = None              # phase name -> [runs, total time, max time]
+        self.counts = None              # count name -> value
+        self.info = None                # name -> text, e.g. parsed file
+        self.clear()
+
+    # Order of phases in output, other phases are appended.
+    _PHASES = ('parse', 'diagnostics', 'error set', 'walk', 'treeview insert', 'cursor render',
+              'token load', 'search')
+
+    def clear(self):
+        with self.lock:
+            self.phases = collections.OrderedDict((phase, [0, 0.0, 0.0])
+                                                  for phase in Metrics._PHASES)
+            self.counts = collections.OrderedDict()
+            self.info = collections.OrderedDict()
+
+    # Add a single run of phase which needs seconds.
+    def add_time(self, phase, seconds):
+        with self.lock:
+            data = self.phases.get(phase)
+            if data is None:
+                data = [0, 0.0, 0.0]
+                self.phases[phase] = data
+            data[0] += 1
+            data[1] += seconds
+            if seconds > data[2]:
+                data[2] = seconds
+
+    def set_count(self, name, value):
+        with self.lock:
+            self.counts[name] = value
+
+    def add_count(self, name, value=1):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def set_info(self, name, text):
+        with self.lock:
+            self.info[name] = text
+
+    # Add all phases, counts and info recorded in other Metrics.
+    def update(self, other):
+        with other.lock:
+            phases = [(phase, list(data)) for phase, data in other.phases.items()]
+            counts = list(other.counts.items())
+            info = list(other.info.items())
+        with self.lock:
+            for phase, data in phases:
+                ownData = self.phases.get(phase)
+                if ownData is None:
+                    self.phases[phase] = data
+                else:
+                    ownData[0] += data[0]
+                    ownData[1] += data[1]
+                    ownData[2] = max(ownData[2], data[2])
+            self.counts.update(counts)
+            self.info.update(info)
+
+    # Return all recorded data as JSON compatible dictionary.
+    def to_dict(self):
+        with self.lock:
+            phases = collections.OrderedDict()
+            for phase, data in self.phases.items():
+                phases[phase] = collections.OrderedDict((('runs', data[0]),
+                                                         ('total', data[1]),
+                                                         ('max', data[2])))
+            return collections.OrderedDict((('info', collections.OrderedDict(self.info)),
+                                            ('phases', phases),
+                                            ('counts', collections.OrderedDict(self.counts))))
+
+    def save(self, fileName):
+        data = self.to_dict()
+        with open(fileName, 'w') as f:
+            json.dump(data, f, indent=2)
+            f.write('\n')
+
+
+# Metrics of the current translation unit, cleared on each parse.
+metrics = Metrics()
+
+
+# Presets of TranslationUnit.PARSE_* options, the less is parsed the faster it is.
+# Tuples of (name used in input files, text shown in InputFrame, parse options).
+PARSE_MODES = (
+    ('full', 'Full', clang.cindex.TranslationUnit.PARSE_NONE),
+    ('declarations', 'Declarations only (fast)',
+     clang.cindex.TranslationUnit.PARSE_SKIP_FUNCTION_BODIES),
+    ('incomplete', 'Incomplete (headers)', clang.cindex.TranslationUnit.PARSE_INCOMPLETE),
+    ('preprocessing', 'With preprocessing record',
+     clang.cindex.TranslationUnit.PARSE_DETAILED_PROCESSING_RECORD)
+    )
+DEFAULT_PARSE_MODE = PARSE_MODES[0][0]
+PARSE_MODE_PREFIX = '#parse-mode='      # line in input file to select a parse mode
+
+
+# Return parse options of parse mode given by name.
+def get_parse_options(parseMode):
+    for name, text, options in PARSE_MODES:
+        if name == parseMode:
+            return options
+    raise ValueError(join('unknown parse mode: ', parseMode))
+
+
+# Read a text file containing input data as written by [Save] of InputFrame.
+# 1st line = file to parse, next lines = Clang arguments, one argument per line.
+# A line like "#parse-mode=declarations" selects one of PARSE_MODES.
+# Return tuple (file to parse, list of arguments, parse mode), empty lines are ignored.
+def read_input_file(filename):
+    with open(filename, 'r') as f:
+        data = f.read()
+    lines = data.split('\n')
+    args = []
+    parseMode = DEFAULT_PARSE_MODE
+    for arg in lines[1:]:
+        if arg.startswith(PARSE_MODE_PREFIX):
+            parseMode = arg[len(PARSE_MODE_PREFIX):].strip()
+            get_parse_options(parseMode) # check name
+        elif len(arg) > 0:
+            args.append(arg)
+    return (lines[0], args, parseMode)
+
+
+# Generator to walk through the AST starting at cursor in the same order as shown in ASTOutputFrame.
+# Yield tuples (cursor, deep, id, parentId), id is the number in walk order starting with 0 for cursor,
+# parentId of cursor is None.
+# Children deeper than maxDeep are skipped. If pathFilter (PathFilter prepared by
+# set_translationunit) is given all cursors not accepted are skipped including their children.
+# Only one children iterator per level is kept, so memory usage do not depend on AST size.
+def iter_cursors(cursor, maxDeep=None, pathFilter=None):
+    yield (cursor, 0, 0, None)
+    cnt = 1
+    stack = [(iter(cursor.get_children()), 0)]    # (children iterator, id of parent)
+    while stack:
+        children, parentId = stack[-1]
+        deep = len(stack)
+        childCursor = next(children, None)
+        if childCursor is None:
+            stack.pop()
+            continue
+        if (pathFilter is not None) and not pathFilter.accept(childCursor):
+            continue
+        curId = cnt
+        cnt += 1
+        yield (childCursor, deep, curId, parentId)
+        if (maxDeep is None) or (deep < maxDeep):
+            stack.append((iter(childCursor.get_children()), curId))
+
+
+# Convert SourceLocation to JSON compatible data.
+def location_to_dict(srcLocation):
+    if srcLocation.file:
+        fileName = toStr(srcLocation.file.name)
+    else:
+        fileName = None
+    return collections.OrderedDict((('file', fileName),
+                                    ('line', srcLocation.line),
+                                    ('column', srcLocation.column),
+                                    ('offset', srcLocation.offset)))
+
+
+# Attributes of a cursor available for --dump, see dump_ast().
+# Each function gets the tuple yielded by iter_cursors and returns JSON compatible data.
+DUMP_ATTRS = collections.OrderedDict((
+    ('id', lambda c: c[2]),
+    ('parent', lambda c: c[3]),
+    ('depth', lambda c: c[1]),
+    ('kind', lambda c: c[0].kind.name),
+    ('spelling', lambda c: toStr(c[0].spelling)),
+    ('displayname', lambda c: toStr(c[0].displayname)),
+    ('hash', lambda c: c[0].hash),
+    ('location', lambda c: location_to_dict(c[0].location)),
+    ('extent', lambda c: collections.OrderedDict((('start', location_to_dict(c[0].extent.start)),
+                                                  ('end', location_to_dict(c[0].extent.end))))),
+    ))
+
+
+# Parse file given by inputFile (same format as used by InputFrame) and write the AST
+# to outFile as JSON Lines, one cursor per line containing all attributes listed in attrs.
+# inputFile may also be a tuple (file name, args, parse mode) like returned by read_input_file.
+# maxDeep and pathFilter (PathFilter) limit the output, see iter_cursors.
+# Raise clang.cindex.TranslationUnitLoadError if the file can not be parsed.
+# Return number of written cursors.
+def dump_ast(inputFile, outFile, maxDeep=None, pathFilter=None, attrs=None):
+    if attrs is None:
+        attrs = list(DUMP_ATTRS.keys())
+    attrFuncs = [(attr, DUMP_ATTRS[attr]) for attr in attrs]
+
+    if isinstance(inputFile, tuple):
+        fileName, args, parseMode = inputFile
+    else:
+        fileName, args, parseMode = read_input_file(inputFile)
+    metrics.set_info('file', fileName)
+    metrics.set_info('parse mode', parseMode)
+    index = clang.cindex.Index.create()
+    startTime = time.time()
+    tu = index.parse(fileName, args=args, options=get_parse_options(parseMode))
+    metrics.add_time('parse', time.time() - startTime)
+    if (pathFilter is not None) and pathFilter.is_active():
+        pathFilter.set_translationunit(tu)
+    else:
+        pathFilter = None
+
+    startTime = time.time()
+    cnt = 0
+    for data in iter_cursors(tu.cursor, maxDeep, pathFilter):
+        line = collections.OrderedDict([(attr, func(data)) for attr, func in attrFuncs])
+        outFile.write(json.dumps(line))
+        outFile.write('\n')
+        cnt += 1
+    metrics.add_time('walk', time.time() - startTime)
+    metrics.set_count('cursors', cnt)
+    return cnt
+
+
+# Diagnostic read from TranslationUnitCache.
+# Diagnostics are not stored in AST files, so TranslationUnitCache stores them by itself.
+# This class have the same attributes as clang.cindex.Diagnostic used by ErrorFrame.
+class CachedDiagnostic:
+    def __init__(self, tu, data):
+        self.severity = data['severity']
+        self.category_number = data['category_number']
+        self.category_name = data['category_name']
+        self.spelling = data['spelling']
+        self.option = data['option']
+        self.location = CachedDiagnostic._get_location(tu, data['location'])
+        self.ranges = [clang.cindex.SourceRange.from_locations(
+                           CachedDiagnostic._get_location(tu, r[0]),
+                           CachedDiagnostic._get_location(tu, r[1]))
+                       for r in data['ranges']]
+
+    # Convert SourceLocation to data stored in cache.
+    @staticmethod
+    def location_to_data(srcLocation):
+        if srcLocation.file:
+            return (toStr(srcLocation.file.name), srcLocation.offset)
+        else:
+            return None
+
+    # Convert a single diagnostic to data stored in cache.
+    @staticmethod
+    def to_data(diag):
+        return {'severity': diag.severity,
+                'category_number': diag.category_number,
+                'category_name': toStr(diag.category_name),
+                'spelling': toStr(diag.spelling),
+                'option': toStr(diag.option),
+                'location': CachedDiagnostic.location_to_data(diag.location),
+                'ranges': [(CachedDiagnostic.location_to_data(r.start),
+                            CachedDiagnostic.location_to_data(r.end)) for r in diag.ranges]}
+
+    @staticmethod
+    def _get_location(tu, data):
+        if data is None:
+            return clang.cindex.SourceLocation() # null location
+        return tu.get_location(data[0], data[1])
+
+
+# Persistent cache of parsed translation units in a directory.
+# Each translation unit is stored with TranslationUnit.save as AST file, next to it a JSON file
+# contains the diagnostics and size, modification time and content hash of all used files
+# (main file and all includes). A cached translation unit is only used if all files are unchanged.
+# If the directory grows bigger than maxSize the least recently used entries are removed.
+# The cache may be used from several threads.
+class TranslationUnitCache:
+    def __init__(self, directory, maxSize=None):
+        self.directory = directory
+        if maxSize is None:
+            maxSize = TranslationUnitCache._MAX_SIZE
+        self.maxSize = maxSize
+        self.lock = threading.Lock()
+
+    _MAX_SIZE = 1024 * 1024 * 1024  # default max size of all stored files in bytes
+    _AST_EXT = '.ast'
+    _INFO_EXT = '.json'
+
+    # Default directory is pyclasvi inside the users cache directory.
+    @staticmethod
+    def default_directory():
+        base = os.environ.get('XDG_CACHE_HOME') or os.environ.get('LOCALAPPDATA')
+        if not base:
+            base = os.path.join(os.path.expanduser('~'), '.cache')
+        return os.path.join(base, 'pyclasvi')
+
+    # Entries depend on file name, arguments, parse options and current working directory
+    # (it may be needed to find the file and includes).
+    def _get_paths(self, fileName, args, options=0):
+        keyData = [os.getcwd(), fileName, list(args)]
+        if options:     # keep keys of entries stored without options
+            keyData.append(options)
+        keyData = json.dumps(keyData)
+        import hashlib
+        key = hashlib.sha1(keyData.encode('utf-8')).hexdigest()
+        base = os.path.join(self.directory, key)
+        return (join(base, TranslationUnitCache._AST_EXT), join(base, TranslationUnitCache._INFO_EXT))
+
+    @staticmethod
+    def _get_file_state(fileName):
+        st = os.stat(fileName)
+        import hashlib
+        h = hashlib.sha1()
+        with open(fileName, 'rb') as f:
+            h.update(f.read())
+        return [st.st_size, st.st_mtime, h.hexdigest()]
+
+    # Check if a file is unchanged, content is only hashed again if size or time has changed.
+    @staticmethod
+    def _is_file_unchanged(fileName, state):
+        try:
+            st = os.stat(fileName)
+            if (st.st_size == state[0]) and (st.st_mtime == state[1]):
+                return True
+            return TranslationUnitCache._get_file_state(fileName)[2] == state[2]
+        except (IOError, OSError):
+            return False
+
+    # Return tuple (translation unit, diagnostics) or None if not in cache or some file has changed.
+    def load(self, index, fileName, args, options=0):
+        astPath, infoPath = self._get_paths(fileName, args, options)
+        with self.lock:
+            try:
+                with open(infoPath, 'r') as f:
+                    info = json.load(f)
+            except (IOError, OSError, ValueError):
+                return None
+            for usedFile, state in info['files'].items():
+                if not TranslationUnitCache._is_file_unchanged(usedFile, state):
+                    return None
+            try:
+                tu = index.read(astPath)
+            except clang.cindex.TranslationUnitLoadError:
+                self._remove(astPath, infoPath)
+                return None
+            try:
+                os.utime(astPath, None) # mark as recently used
+            except OSError:
+                pass    # e.g. read-only cache, the entry is only evicted earlier
+            diagnostics = [CachedDiagnostic(tu, d) for d in info['diagnostics']]
+        return (tu, diagnostics)
+
+    # Store translation unit parsed from fileName with args and options.
+    # Return True if stored.
+    def store(self, tu, fileName, args, options=0):
+        astPath, infoPath = self._get_paths(fileName, args, options)
+        try:
+            files = {fileName: TranslationUnitCache._get_file_state(fileName)}
+            for include in tu.get_includes():
+                includeName = toStr(include.include.name)
+                if includeName not in files:
+                    files[includeName] = TranslationUnitCache._get_file_state(includeName)
+            info = {'files': files,
+                    'diagnostics': [CachedDiagnostic.to_data(d) for d in tu.diagnostics]}
+        except (IOError, OSError):
+            return False
+
+        with self.lock:
+            try:
+                if not os.path.isdir(self.directory):
+                    os.makedirs(self.directory)
+                tu.save(astPath)
+                with open(infoPath, 'w') as f:
+                    json.dump(info, f)
+            except (IOError, OSError, clang.cindex.TranslationUnitSaveError):
+                self._remove(astPath, infoPath)
+                return False
+            self._evict()
+            # removed again if bigger than the whole cache
+            return os.path.exists(astPath)
+
+    @staticmethod
+    def _remove(*paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    # Remove least recently used entries until cache is small enough.
+    def _evict(self):
+        entries = []
+        totalSize = 0
+        for name in os.listdir(self.directory):
+            if name.endswith(TranslationUnitCache._AST_EXT):
+                astPath = os.path.join(self.directory, name)
+                infoPath = join(astPath[:-len(TranslationUnitCache._AST_EXT)],
+                                TranslationUnitCache._INFO_EXT)
+                try:
+                    st = os.stat(astPath)
+                    size = st.st_size
+                    if os.path.exists(infoPath):
+                        size += os.path.getsize(infoPath)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, size, astPath, infoPath))
+                totalSize += size
+        entries.sort()
+        for mtime, size, astPath, infoPath in entries:
+            if totalSize <= self.maxSize:
+                break
+            self._remove(astPath, infoPath)
+            totalSize -= size
+
+    # Remove all entries.
+    def clear(self):
+        with self.lock:
+            if not os.path.isdir(self.directory):
+                return
+            for name in os.listdir(self.directory):
+                if (name.endswith(TranslationUnitCache._AST_EXT) or
+                    name.endswith(TranslationUnitCache._INFO_EXT)):
+                    self._remove(os.path.join(self.directory, name))
+
+
+# Compile commands of build directories read from compile_commands.json by
+# clang.cindex.CompilationDatabase. Each command is converted to a tuple (file name, args)
+# usable for Index.parse.
+# Reading a big database by libclang takes some time, so the converted commands are kept in memory
+# and stored in directory (if not None) together with size and modification time of the database.
+# They are only read again by libclang if the database has changed.
+class CompileCommandsCache:
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.databases = {}             # path of database -> (state, commands), see load()
+        self.lock = threading.Lock()    # load() is called by background threads
+
+    _FILE_NAME = 'compile_commands.json'
+    _EXT = '.cdb.json'
+    _VERSION = 2                        # version of stored commands, increment if conversion changes
+
+    # Arguments of a compiler call not used for parsing,
+    # True if the argument is followed by a value which is also not used.
+    _SKIP_ARGS = {
+        '-c': False,
+        '-o': True,
+        '-MD': False,
+        '-MMD': False,
+        '-MF': True,
+        '-MT': True,
+        '-MQ': True,
+        '--': False,
+        }
+
+    # Arguments followed by a path, as separate or joined argument (e.g. -Iinc or --sysroot=dir).
+    # Longer names first, so -isysroot is not taken for -isystem.
+    _PATH_ARGS = ('-isysroot', '-isystem', '-iquote', '-idirafter', '-include', '-imacros',
+                  '--sysroot', '-I', '-F')
+
+    # Return path made absolute by directory.
+    @staticmethod
+    def _get_abs_path(path, directory):
+        return os.path.normpath(os.path.join(directory, path))
+
+    def _get_path(self, dbPath):
+        import hashlib
+        key = hashlib.sha1(dbPath.encode('utf-8')).hexdigest()
+        return join(os.path.join(self.directory, key), CompileCommandsCache._EXT)
+
+    # Convert arguments of a compiler call of fileName to args used for Index.parse.
+    # The compiler, the source file and the output arguments are removed.
+    # Paths of _PATH_ARGS are made absolute, so libclang reports the included files with
+    # names usable from the current directory. The working directory of the call is added
+    # for all other relative paths.
+    @staticmethod
+    def _get_parse_args(arguments, fileName, directory):
+        args = []
+        skipNext = False
+        pathNext = False
+        for arg in arguments[1:]:
+            if skipNext:
+                skipNext = False
+            elif pathNext:
+                pathNext = False
+                args.append(CompileCommandsCache._get_abs_path(arg, directory))
+            elif arg in CompileCommandsCache._SKIP_ARGS:
+                skipNext = CompileCommandsCache._SKIP_ARGS[arg]
+            elif arg in CompileCommandsCache._PATH_ARGS:
+                pathNext = True
+                args.append(arg)
+            elif CompileCommandsCache._get_abs_path(arg, directory) != fileName:
+                for name in CompileCommandsCache._PATH_ARGS:
+                    if arg.startswith(name):
+                        path = arg[len(name):]
+                        if (name == '--sysroot') and path.startswith('='):
+                            name = join(name, '=')
+                            path = path[1:]
+                        if not path.startswith('='):    # e.g. -I=dir is relative to sysroot
+                            arg = join(name, CompileCommandsCache._get_abs_path(path, directory))
+                        break
+                args.append(arg)
+        args.append(join('-working-directory=', directory))
+        return args
 
-    def __eq__(self, other):
-        return self.obj == other.obj
+    # Read all commands from database by libclang.
+    @staticmethod
+    def _read(buildDir):
+        db = clang.cindex.CompilationDatabase.fromDirectory(buildDir)
+        commands = []
+        for cmd in db.getAllCompileCommands() or []:
+            directory = toStr(cmd.directory)
+            fileName = os.path.normpath(os.path.join(directory, toStr(cmd.filename)))
+            arguments = [toStr(arg) for arg in cmd.arguments]
+            commands.append((fileName, CompileCommandsCache._get_parse_args(arguments, fileName,
+                                                                             directory)))
+        commands.sort()
+        return commands
+
+    # Return list of tuples (file name, args) of all commands in compile_commands.json
+    # of buildDir sorted by file name.
+    def load(self, buildDir):
+        dbPath = os.path.abspath(os.path.join(buildDir, CompileCommandsCache._FILE_NAME))
+        with self.lock:
+            st = os.stat(dbPath)
+            state = [st.st_size, st.st_mtime]
+            data = self.databases.get(dbPath)
+            if (data is not None) and (data[0] == state):
+                return data[1]
+
+            commands = None
+            if self.directory is not None:
+                try:
+                    with open(self._get_path(dbPath), 'r') as f:
+                        data = json.load(f)
+                    if (data.get('version') == CompileCommandsCache._VERSION) and (data['state'] == state):
+                        commands = [(fileName, args) for fileName, args in data['commands']]
+                except (IOError, OSError, ValueError, KeyError):
+                    pass
+            if commands is None:
+                commands = CompileCommandsCache._read(os.path.dirname(dbPath))
+                if self.directory is not None:
+                    try:
+                        if not os.path.isdir(self.directory):
+                            os.makedirs(self.directory)
+                        with open(self._get_path(dbPath), 'w') as f:
+                            json.dump({'version': CompileCommandsCache._VERSION, 'file': dbPath,
+                                       'state': state, 'commands': commands}, f)
+                    except (IOError, OSError):
+                        pass
+            self.databases[dbPath] = (state, commands)
+            return commands
+
+
+# Return index of the command of fileName in commands (list of tuples (file name, args)),
+# None if not found.
+# fileName is the path of the file or the end of it (e.g. src/main.cpp) if this is unique.
+def find_compile_command(commands, fileName):
+    absName = os.path.abspath(fileName)
+    for idx, (name, args) in enumerate(commands):
+        if name == absName:
+            return idx
+    suffix = join(os.sep, os.path.normpath(fileName))
+    found = [idx for idx, (name, args) in enumerate(commands) if name.endswith(suffix)]
+    if (not found) or any(commands[idx][0] != commands[found[0]][0] for idx in found):
+        return None     # not found or not unique
+    return found[0]
+
+
+# Content of a source file read by FileContentCache.
+# text is the decoded content, size and mtime are used to detect changes.
+# libclang columns count bytes but the Text widget counts characters, so for files
+# containing non ASCII characters the raw data and the byte offset of each line start
+# (index 0 for line 1) are kept to convert the columns, see get_index().
+class FileContent:
+    def __init__(self, fileName, data, mtime):
+        self.fileName = fileName
+        self.size = len(data)
+        self.mtime = mtime
+        self.text = data.decode('utf-8', 'replace')
+        self.data = None
+        self.lineOffsets = None
+        if len(self.text) != len(data):     # else each byte is a single character
+            self.data = data
+            self.lineOffsets = array.array('l', [0])
+            pos = data.find(b'\n')
+            while pos >= 0:
+                self.lineOffsets.append(pos + 1)
+                pos = data.find(b'\n', pos + 1)
+
+    # Return index used by Text widget of a position given by line and column like libclang,
+    # both starting with 1.
+    def get_index(self, line, column):
+        if (self.lineOffsets is not None) and (1 <= line <= len(self.lineOffsets)):
+            start = self.lineOffsets[line-1]
+            column = len(self.data[start:start+column-1].decode('utf-8', 'replace')) + 1
+        return '{0}.{1}'.format(line, column-1)
+
+
+# Cache for content of source files shared by all FileOutputFrames.
+# The least recently used files are removed if the size of all files is above maxSize (bytes).
+# A file is read again if size or modification time has changed.
+class FileContentCache:
+    def __init__(self, maxSize=None):
+        if maxSize is None:
+            maxSize = FileContentCache._MAX_SIZE
+        self.maxSize = maxSize
+        self.files = collections.OrderedDict()  # file name -> FileContent, least recently used first
+        self.size = 0
+
+    _MAX_SIZE = 64*1024*1024
+
+    # Return FileContent of fileName.
+    def get(self, fileName):
+        fileStat = os.stat(fileName)
+        content = self.files.pop(fileName, None)
+        if content is not None:
+            self.size -= content.size
+            if (content.size != fileStat.st_size) or (content.mtime != fileStat.st_mtime):
+                content = None
+        if content is None:
+            with open(fileName, 'rb') as f:
+                data = f.read()
+            content = FileContent(fileName, data, fileStat.st_mtime)
+        self.files[fileName] = content
+        self.size += content.size
+        while (self.size > self.maxSize) and (len(self.files) > 1):
+            oldName, oldContent = self.files.popitem(last=False)
+            self.size -= oldContent.size
+        return content
 
-    def __hash__(self):
-        return self.obj.hash
+    def clear(self):
+        self.files.clear()
+        self.size = 0
 
 
 # Make widget scrollable by adding scrollbars to the right and below it.
 # Of course parent is the parent widget of widget.
 # If there are more than one widget inside the parent use widgetRow and widgetColumn
 # to specify witch widget should be scrollable.
+# Return tuple of the vertical and horizontal scrollbar.
 def make_scrollable(parent, widget, widgetRow=0, widgetColumn=0):
         vsb = ttk.Scrollbar(parent, orient='vertical',command=widget.yview)
         widget.configure(yscrollcommand=vsb.set)
@@ -116,17 +841,29 @@ def make_scrollable(parent, widget, widgetRow=0, widgetColumn=0):
         widget.configure(xscrollcommand=hsb.set)
         hsb.grid(row=widgetRow+1, column=widgetColumn, sticky='we')
 
+        return (vsb, hsb)
+
 
 # Widget to handle all inputs (file name and parameters).
 # Contain [Parse] Button to start parsing and fill result in output frames
+# and [Cancel] Button to abandon a running parse.
 class InputFrame(ttk.Frame):
-    def __init__(self, master=None, parseCmd=None):
+    def __init__(self, master=None, parseCmd=None, cancelCmd=None, compileCommandsCmd=None):
         ttk.Frame.__init__(self, master)
         self.grid(sticky='nswe')
         self.parseCmd = parseCmd
+        self.cancelCmd = cancelCmd
+        self.compileCommandsCmd = compileCommandsCmd # load compile commands of build directory
+        self.buildDir = None                                              # last used build directory
+        self.progressValue = tk.StringVar(value='')                       # state of running parse
+        self.reparseValue = tk.IntVar(value=1)                            # reparse unchanged input
+        self.parseModeValue = tk.StringVar(value=PARSE_MODES[0][1])       # text of selected PARSE_MODES
         self.filename = tk.StringVar(value='')
         self.xValue = tk.StringVar(value=InputFrame._X_OPTIONS[0])       # Option starting with "-x"
         self.stdValue = tk.StringVar(value=InputFrame._STD_OPTIONS[0])   # Option starting with "-std"
+        self.mainFileOnlyValue = tk.IntVar(value=0)                       # PathFilter settings
+        self.includePathsValue = tk.StringVar(value='')
+        self.excludePathsValue = tk.StringVar(value='')
         self._create_widgets()
 
     _SOURCEFILETYPES = (
@@ -148,6 +885,7 @@ class InputFrame(ttk.Frame):
         ('Text files', '.txt', 'TEXT'),
         ('All files', '*'),
         )
+    _PATTERN_SEPARATOR = ';'            # separator of glob patterns in include/exclude entry
     _X_OPTIONS = (
         'no -x',
         '-xc',
@@ -219,9 +957,22 @@ class InputFrame(ttk.Frame):
         self.argsText.grid(row=4, sticky='nswe')
         make_scrollable(self, self.argsText, widgetRow=4, widgetColumn=0)
 
+        filterFrame = ttk.Frame(self)
+        filterFrame.grid(row=6, column=0, columnspan=2, sticky='we')
+        filterFrame.columnconfigure(2, weight=1)
+        filterFrame.columnconfigure(4, weight=1)
+        cb = ttk.Checkbutton(filterFrame, text='Main file only', variable=self.mainFileOnlyValue)
+        cb.grid(row=0, column=0)
+        ttk.Label(filterFrame, text='Include paths:').grid(row=0, column=1)
+        entry = ttk.Entry(filterFrame, textvariable=self.includePathsValue)
+        entry.grid(row=0, column=2, sticky='we')
+        ttk.Label(filterFrame, text='Exclude paths:').grid(row=0, column=3)
+        entry = ttk.Entry(filterFrame, textvariable=self.excludePathsValue)
+        entry.grid(row=0, column=4, sticky='we')
+
         buttonFrame = ttk.Frame(self)
-        buttonFrame.grid(row=6, column=0, columnspan=2, sticky='we')
-        buttonFrame.columnconfigure(2, weight=1)
+        buttonFrame.grid(row=7, column=0, columnspan=2, sticky='we')
+        buttonFrame.columnconfigure(3, weight=1)
 
         button = ttk.Button(buttonFrame, text='Load', command=self._on_file_load)
         button.grid(row=0, column=0)
@@ -229,18 +980,44 @@ class InputFrame(ttk.Frame):
         button = ttk.Button(buttonFrame, text='Save', command=self._on_file_save)
         button.grid(row=0, column=1)
 
-        button = ttk.Button(buttonFrame, text='Parse', command=self.parseCmd)
-        button.grid(row=0, column=2, sticky='we')
+        button = ttk.Button(buttonFrame, text='Build dir', command=self._on_build_dir)
+        button.grid(row=0, column=2)
+
+        self.parseBtn = ttk.Button(buttonFrame, text='Parse', command=self.parseCmd)
+        self.parseBtn.grid(row=0, column=3, sticky='we')
+
+        self.cancelBtn = ttk.Button(buttonFrame, text='Cancel', command=self.cancelCmd,
+                                    state='disabled')
+        self.cancelBtn.grid(row=0, column=4)
+
+        cb = ttk.Checkbutton(buttonFrame, text='Reparse', variable=self.reparseValue)
+        cb.grid(row=0, column=5)
+
+        modeCBox = ttk.Combobox(buttonFrame, textvariable=self.parseModeValue, state='readonly',
+                values=[text for name, text, options in PARSE_MODES])
+        modeCBox.grid(row=0, column=6)
 
+        progressFrame = ttk.Frame(self)
+        progressFrame.grid(row=8, column=0, columnspan=2, sticky='we')
+        progressFrame.columnconfigure(1, weight=1)
+
+        self.progressBar = ttk.Progressbar(progressFrame, mode='indeterminate')
+        self.progressBar.grid(row=0, column=0)
+        label = ttk.Label(progressFrame, textvariable=self.progressValue)
+        label.grid(row=0, column=1, sticky='we')
+
+    # Load input data from filename, see read_input_file.
+    # Return True if loaded, else the error is shown.
     def load_filename(self, filename):
-        data = []
-        with open(filename, 'r') as f:
-            data = f.read()
-        if data:
-            lines = data.split('\n')
-            if len(lines) > 0:
-                self.set_filename(lines[0])
-            self.set_args(lines[1:])
+        try:
+            fileName, args, parseMode = read_input_file(filename)
+        except (IOError, OSError, ValueError) as e:
+            tkMessageBox.showerror('Load input file', xjoin(e.__class__.__name__, ': ', e))
+            return False
+        self.set_filename(fileName)
+        self.set_args(args)
+        self.set_parse_mode(parseMode)
+        return True
 
     def _on_file_load(self):
         fn = tkFileDialog.askopenfilename(filetypes=InputFrame._FILETYPES)
@@ -250,9 +1027,49 @@ class InputFrame(ttk.Frame):
     def _on_file_save(self):
         with tkFileDialog.asksaveasfile(defaultextension='.txt', filetypes=InputFrame._FILETYPES) as f:
             f.write(join(self.get_filename(), '\n'))
+            parseMode = self.get_parse_mode()
+            if parseMode != DEFAULT_PARSE_MODE:
+                f.write(join(PARSE_MODE_PREFIX, parseMode, '\n'))
             for arg in self.get_args():
                 f.write(join(arg, '\n'))
 
+    def _on_build_dir(self):
+        buildDir = tkFileDialog.askdirectory(initialdir=self.buildDir)
+        if buildDir:
+            self.load_build_dir(buildDir)
+
+    # Read compile_commands.json of buildDir and use file name and arguments of one of its commands.
+    # If fileName is None the file is selected by user, else see find_compile_command.
+    # The commands are loaded in background, so the file and arguments are set later
+    # by _on_compile_commands.
+    def load_build_dir(self, buildDir, fileName=None):
+        self.compileCommandsCmd(buildDir,
+                                lambda commands, error:
+                                    self._on_compile_commands(buildDir, fileName, commands, error))
+
+    # Called when the commands of buildDir are loaded or loading failed with error.
+    # Return True if a command was used.
+    def _on_compile_commands(self, buildDir, fileName, commands, error):
+        if error is not None:
+            tkMessageBox.showerror('Build directory', xjoin(error.__class__.__name__, ': ', error))
+            return False
+        self.buildDir = buildDir
+        if fileName is None:
+            dialog = CompileCommandDialog(self.winfo_toplevel(),
+                                          [name for name, args in commands])
+            idx = dialog.result
+        else:
+            idx = find_compile_command(commands, fileName)
+            if idx is None:
+                tkMessageBox.showerror('Build directory',
+                                       join(fileName, ' not found in compile commands of ', buildDir))
+        if idx is None:
+            return False
+        name, args = commands[idx]
+        self.set_filename(name)
+        self.set_args(args)
+        return True
+
     def _on_select_file(self):
         fn = tkFileDialog.askopenfilename(filetypes=self._SOURCEFILETYPES)
         if fn:
@@ -281,6 +1098,49 @@ class InputFrame(ttk.Frame):
     def set_parse_cmd(self, parseCmd):
         self.parseCmd = parseCmd
 
+    # Switch buttons and progress bar between running and stopped parse.
+    def set_parse_running(self, running):
+        if running:
+            self.cancelBtn.config(state='normal')
+            self.progressBar.start()
+        else:
+            self.cancelBtn.config(state='disabled')
+            self.progressBar.stop()
+
+    def set_progress(self, text):
+        self.progressValue.set(text)
+
+    # Return True if last translation unit should be reparsed if file name and arguments are unchanged.
+    def get_reparse(self):
+        return self.reparseValue.get() != 0
+
+    # Select one of PARSE_MODES by name.
+    def set_parse_mode(self, parseMode):
+        for name, text, options in PARSE_MODES:
+            if name == parseMode:
+                self.parseModeValue.set(text)
+
+    # Return name of selected parse mode.
+    def get_parse_mode(self):
+        modeText = self.parseModeValue.get()
+        for name, text, options in PARSE_MODES:
+            if text == modeText:
+                return name
+        return DEFAULT_PARSE_MODE
+
+    # Set the filter for cursors shown in AST (see PathFilter).
+    def set_path_filter(self, pathFilter):
+        self.mainFileOnlyValue.set(1 if pathFilter.mainFileOnly else 0)
+        sep = InputFrame._PATTERN_SEPARATOR
+        self.includePathsValue.set(sep.join(pathFilter.includes))
+        self.excludePathsValue.set(sep.join(pathFilter.excludes))
+
+    def get_path_filter(self):
+        sep = InputFrame._PATTERN_SEPARATOR
+        includes = [p.strip() for p in self.includePathsValue.get().split(sep) if p.strip()]
+        excludes = [p.strip() for p in self.excludePathsValue.get().split(sep) if p.strip()]
+        return PathFilter(self.mainFileOnlyValue.get() != 0, includes, excludes)
+
     def set_filename(self, fn):
         self.filename.set(fn)
 
@@ -339,10 +1199,15 @@ class ErrorFrame(ttk.Frame):
         ttk.Frame.__init__(self, master)
         self.grid(sticky='nswe')
         self.filterValue=tk.StringVar(value=ErrorFrame._DIAG_STR_TAB[0]) # filter by severity
+        self.summaryValue=tk.StringVar(value='')    # number of diagnostics by severity
         self._create_widgets()
         self.errors = []                # list of diagnostics (also warnings not only errors)
+        self.severities = []            # severity of each diagnostic, index is the IID
+        self.shown = []                 # False if row is detached by filter, index is the IID
+        self.severityCnts = {}          # number of diagnostics by severity
+        self._update_summary()
 
-    # _DIAG_LEVEL_TAB and _DIAG_STR_TAB must have the same size and order
+    # _DIAG_LEVEL_TAB, _DIAG_STR_TAB and _DIAG_NAME_TAB must have the same size and order
     _DIAG_LEVEL_TAB = (
         clang.cindex.Diagnostic.Ignored,
         clang.cindex.Diagnostic.Note,
@@ -357,6 +1222,7 @@ class ErrorFrame(ttk.Frame):
         xjoin(clang.cindex.Diagnostic.Error,   ' Error'),
         xjoin(clang.cindex.Diagnostic.Fatal,   ' Fatal')
         )
+    _DIAG_NAME_TAB = ('Ignored', 'Note', 'Warning', 'Error', 'Fatal')
     _DIAG_TAG_TAB = {clang.cindex.Diagnostic.Warning:('warning',),
                    clang.cindex.Diagnostic.Error:('error',),
                    clang.cindex.Diagnostic.Fatal:('fatal',)}
@@ -383,6 +1249,8 @@ class ErrorFrame(ttk.Frame):
             values=ErrorFrame._DIAG_STR_TAB)
         filterCBox.bind('<<ComboboxSelected>>', self._filter)
         filterCBox.grid(row=0, column=1)
+        summaryLabel = tk.Label(buttonFrame, textvariable=self.summaryValue)
+        summaryLabel.grid(row=0, column=2, padx=10)
 
         self.errorTable = ttk.Treeview(frame, columns=('category', 'severity', 'spelling', 'location',
                                                        'option'))
@@ -423,69 +1291,717 @@ class ErrorFrame(ttk.Frame):
         self.fileOutputFrame.set_location(range1, err.location)
 
     # Filter by selected severity
+    # All rows stay in the Treeview, hidden rows are only detached.
+    # Rows are reattached in order so they get back to their old position.
     def _filter(self, e=None):
-        for i in self.errorTable.get_children():
-            self.errorTable.delete(i)
         i = ErrorFrame._DIAG_STR_TAB.index(self.filterValue.get())
         diagLevel = ErrorFrame._DIAG_LEVEL_TAB[i]
-        cnt = 0
-        for err in self.errors:
-            cnt = cnt + 1
-            if err.severity < diagLevel:
-                continue
-            if err.severity in ErrorFrame._DIAG_LEVEL_TAB:
-                i = ErrorFrame._DIAG_LEVEL_TAB.index(err.severity)
-                serverity = ErrorFrame._DIAG_STR_TAB[i]
-            else:
-                serverity = str(err.severity)
-            if err.severity in ErrorFrame._DIAG_TAG_TAB:
-                tagsVal=ErrorFrame._DIAG_TAG_TAB[err.severity]
-            else:
-                tagsVal=()
-            if err.location.file:
-                location = '{} {}:{}'.format(err.location.file.name,
-                                             err.location.line,
-                                             err.location.offset)
-            else:
-                location = None
-            self.errorTable.insert('', 'end', text=str(cnt), values=[
-                join(str(err.category_number), ' ',  toStr(err.category_name)),
-                serverity,
-                err.spelling,
-                location,
-                err.option
-                ],
-                tags=tagsVal,
-                iid=str(cnt-1))
+        hide = []
+        for iid, severity in enumerate(self.severities):
+            if self.shown[iid] and severity < diagLevel:
+                self.shown[iid] = False
+                hide.append(str(iid))
+        if hide:
+            self.errorTable.detach(*hide)
+        pos = 0
+        for iid, severity in enumerate(self.severities):
+            if severity >= diagLevel:
+                if not self.shown[iid]:
+                    self.shown[iid] = True
+                    self.errorTable.reattach(str(iid), '', pos)
+                pos = pos + 1
+
+    # Create text for summary label from counts by severity
+    def _update_summary(self):
+        parts = []
+        for level, name in zip(reversed(ErrorFrame._DIAG_LEVEL_TAB),
+                               reversed(ErrorFrame._DIAG_NAME_TAB)):
+            parts.append('{0}: {1}'.format(name, self.severityCnts.get(level, 0)))
+        self.summaryValue.set(', '.join(parts))
 
     def clear(self):
-        self.errors = []
         self.fileOutputFrame.clear()
-        for i in self.errorTable.get_children():
-            self.errorTable.delete(i)
+        if self.errors:
+            self.errorTable.delete(*[str(iid) for iid in range(len(self.errors))])
+        self.errors = []
+        self.severities = []
+        self.shown = []
+        self.severityCnts = {}
+        self._update_summary()
 
+    # Extract all values shown in the table once and insert all rows.
+    # Later filter changes only detach and reattach rows.
     def set_errors(self, errors):
+        startTime = time.time()
         self.clear()
+        i = ErrorFrame._DIAG_STR_TAB.index(self.filterValue.get())
+        diagLevel = ErrorFrame._DIAG_LEVEL_TAB[i]
+        levelStrs = dict(zip(ErrorFrame._DIAG_LEVEL_TAB, ErrorFrame._DIAG_STR_TAB))
+        severityCnts = self.severityCnts
+        hide = []
+        cnt = 0
         for err in errors:
+            severity = err.severity
+            location = err.location
+            if location.file:
+                locationStr = '{} {}:{}'.format(location.file.name,
+                                                location.line,
+                                                location.offset)
+            else:
+                locationStr = None
+            row = (join(str(err.category_number), ' ',  toStr(err.category_name)),
+                   levelStrs.get(severity, str(severity)),
+                   err.spelling,
+                   locationStr,
+                   err.option)
+            iid = str(cnt)
+            cnt = cnt + 1
             self.errors.append(err)
-        self._filter()
+            self.severities.append(severity)
+            self.shown.append(severity >= diagLevel)
+            severityCnts[severity] = severityCnts.get(severity, 0) + 1
+            self.errorTable.insert('', 'end', text=str(cnt), values=row,
+                                   tags=ErrorFrame._DIAG_TAG_TAB.get(severity, ()),
+                                   iid=iid)
+            if severity < diagLevel:
+                hide.append(iid)
+        if hide:
+            self.errorTable.detach(*hide)
+        self._update_summary()
+        metrics.add_time('error set', time.time() - startTime)
+        metrics.set_count('diagnostics', len(self.errors))
 
         return len(self.errors)
 
 
+# Decide which cursors are part of the AST by the file of their location.
+# Cursors located in a file not accepted are skipped including all their children.
+# Cursors without a file (e.g. the translation unit) are always accepted.
+# Each file is checked only once and the result is remembered by its libclang file pointer,
+# so while walking only pointers are compared and no file names are created.
+class PathFilter:
+    def __init__(self, mainFileOnly=False, includes=None, excludes=None):
+        self.mainFileOnly = mainFileOnly    # accept only the parsed file
+        self.includes = includes or []  # glob patterns, if given a file must match one of them
+        self.excludes = excludes or []  # glob patterns, a file must not match any of them
+        self.mainFile = None            # name of parsed file
+        self.mapFileToAccepted = {}     # file pointer -> True if accepted
+        self.fileOut = clang.cindex.c_object_p()    # output of clang_getInstantiationLocation ...
+        self.filePtr = ctypes.c_void_p.from_buffer(self.fileOut) # ... and its value
+
+    # Return True if any file can be rejected.
+    def is_active(self):
+        return self.mainFileOnly or bool(self.includes) or bool(self.excludes)
+
+    # Must be called before checking cursors of tu.
+    def set_translationunit(self, tu):
+        self.mainFile = toStr(tu.spelling)
+        self.mapFileToAccepted = {}
+
+    def accept_file_name(self, fileName):
+        if self.mainFileOnly and (fileName != self.mainFile):
+            return False
+        if self.includes:
+            for pattern in self.includes:
+                if fnmatch.fnmatch(fileName, pattern):
+                    break
+            else:
+                return False
+        for pattern in self.excludes:
+            if fnmatch.fnmatch(fileName, pattern):
+                return False
+        return True
+
+    def accept(self, cursor):
+        lib = clang.cindex.conf.lib
+        lib.clang_getInstantiationLocation(lib.clang_getCursorLocation(cursor),
+                                           ctypes.byref(self.fileOut), None, None, None)
+        filePtr = self.filePtr.value
+        if not filePtr:
+            return True
+        accepted = self.mapFileToAccepted.get(filePtr)
+        if accepted is None:
+            accepted = self.accept_file_name(toStr(clang.cindex.File(self.fileOut).name))
+            self.mapFileToAccepted[filePtr] = accepted
+        return accepted
+
+
+# All Cursors of a translation unit mapped to IIDs used by the Treeview in ASTOutputFrame.
+# This class do not use any Tk objects, so the AST can be walked in a background thread.
+# Each cursor is a node with an integer id, the number of the cursor in walk order.
+# The IID of a node is just this number as string, so IIDs can sorted in AST order.
+# To keep memory usage low for big ASTs no Cursor objects are kept, all node data are stored
+# in array columns indexed by node id and Cursor objects are re-created from their raw data on demand.
+# While walking a search index is build, so search() do not need to ask libclang.
+# The children of a cursor found several times are walked only once, the other nodes of this cursor
+# share them. Copies of shared children are created when they are needed, see get_child_iids().
+# These copies get node ids behind all walked nodes and are not part of the search index.
+class CursorTree:
+    def __init__(self, pathFilter=None):
+        self.translationunit = None
+        self.pathFilter = None          # PathFilter to skip cursors while walking
+        if (pathFilter is not None) and pathFilter.is_active():
+            self.pathFilter = pathFilter
+        self.cursorData = bytearray()   # raw data of all cursors, see get_cursor()
+        self.parents = array.array('l') # node columns: parent node id, -1 for root
+        self.firstChilds = array.array('l') #           first child node id, -1 if no children
+        self.nextSiblings = array.array('l')#           next sibling node id, -1 for last child
+        self.depths = array.array('l')  #               depth in tree, 0 for root
+        self.kindIds = array.array('l') #               CursorKind id
+        self.spellingIds = array.array('l') #           index in spellings
+        self.hashes = array.array('L')  # hash of each node, only used while walking
+        self.sortedHashes = None        # hashes of all nodes sorted ...
+        self.hashOrder = None           # ... and the node ids in this order, see find_iids()
+        self.doubleNodes = array.array('l') # doubles (same cursor several times in AST) as CSR index:
+        self.doubleStarts = array.array('l', (0,)) # nodes of group n are doubleNodes[doubleStarts[n]:doubleStarts[n+1]]
+        self.doubleKeys = array.array('l') #  sorted node ids of all doubles ...
+        self.doubleGroups = array.array('l')# ... and their group number
+        self.mapRawToNode = {}          # identity cache of find_iids(): raw cursor data -> node id or -1
+        self.mapKindIdToIsDecl = {}     # CursorKind id -> is declaration, see _is_same_cursor
+        self.mapHashToWalked = None     # hash -> node id with walked children, only used while walking
+        self.mapSharedToOrigin = {}     # node id -> walked node id whose children it shares
+        self.mapCopyToOrigin = {}       # node id of copy -> walked node id it is copied from
+        self.mapOriginToCopies = {}     # walked node id -> node ids of its copies
+        self.mapOriginToSharers = {}    # walked node id -> walked node ids sharing its children
+        self.mapNodeToPositions = {}    # walked node id -> node ids of all its positions, see _get_occurrences
+        self.spellings = []             # all different spellings, index is the spelling id
+        self.mapSpellingToId = {}       # spelling -> spelling id
+        self.spellingNodes = []         # search index: spelling id -> node ids
+        self.mapLowerSpellingToIds = {} #               lower case spelling -> spelling ids
+        self.mapTrigramToSpellingIds = None # trigram of lower case spelling -> spelling ids, see search()
+        self.canceled = False           # set by cancel() to stop a running walk
+        self.visitor = None             # used while walking, see _get_children
+        self.visitedChildren = None
+        self.cntCursors = 0             # some statistics, cursors, doubles and depths count all
+                                        # positions in the AST incl. shared children
+        self.cntDouble = 0
+        self.cntMaxDoubles = 0
+        self.cntMaxChildren = 0
+        self.cntMaxDeep = 0
+        self.cntHashCollisions = 0      # different cursors with same hash
+        self.cntFastCompares = 0        # cursor compares done without libclang, see _is_same_cursor
+        self.cntLibCompares = 0         # cursor compares done by clang_equalCursors
+        self.cntShared = 0              # nodes sharing the children of an other node
+        self.cntCopies = 0              # nodes created as copy of a shared child
+
+    _CURSOR_SIZE = ctypes.sizeof(clang.cindex.Cursor)
+    _DATA_START = clang.cindex.Cursor.data.offset   # position of data[] in raw data of a cursor
+    _DATA1_START = _DATA_START + ctypes.sizeof(ctypes.c_void_p) # position of data[1]
+    _DATA2_START = _DATA1_START + ctypes.sizeof(ctypes.c_void_p) # position of data[2]
+
+    # Stop a running walk, this may be called from an other thread.
+    def cancel(self):
+        self.canceled = True
+
+    # Append a new node to all columns and the search index, return its node id.
+    def _add_node(self, cursor, parent, deep):
+        node = len(self.parents)
+        self.cursorData.extend(ctypes.string_at(ctypes.addressof(cursor), CursorTree._CURSOR_SIZE))
+        self.parents.append(parent)
+        self.firstChilds.append(-1)
+        self.nextSiblings.append(-1)
+        self.depths.append(deep)
+        self.kindIds.append(cursor._kind_id)
+        self.hashes.append(cursor.hash)
+
+        spelling = toStr(cursor.spelling)
+        spellingId = self.mapSpellingToId.get(spelling)
+        if spellingId is None:
+            spellingId = len(self.spellings)
+            self.spellings.append(spelling)
+            self.mapSpellingToId[spelling] = spellingId
+            self.spellingNodes.append(array.array('l'))
+            self.mapLowerSpellingToIds.setdefault(spelling.lower(), []).append(spellingId)
+        self.spellingIds.append(spellingId)
+        self.spellingNodes[spellingId].append(node)
+
+        self.cntCursors = self.cntCursors + 1
+        return node
+
+    _VISIT_CONTINUE = 1 # return value of visitor function used by clang_visitChildren
+
+    # Visitor function for clang_visitChildren, collect all direct children.
+    def _visit_child(self, cursor, parentCursor, data):
+        cursor._tu = self.translationunit   # like Cursor.get_children does
+        self.visitedChildren.append(cursor)
+        return CursorTree._VISIT_CONTINUE
+
+    # Return a list of all direct children of cursor.
+    # clang_visitChildren is called only once per cursor and with the same visitor
+    # for the whole walk, no iterator objects are created.
+    def _get_children(self, cursor):
+        self.visitedChildren = []
+        clang.cindex.conf.lib.clang_visitChildren(cursor, self.visitor, None)
+        return self.visitedChildren
+
+    # Walk through the whole AST of tu.
+    # An explicit stack is used instead of recursion, so deep ASTs don't hit the recursion limit.
+    # Each stack entry is [children, node id, index of next child, last child node id,
+    # number of positions below node, max depth below node].
+    # Cursors rejected by pathFilter are skipped without visiting their children.
+    # Children of a cursor already walked before are not visited again but shared.
+    # Their positions are still counted, so the statistics are the same as without sharing.
+    # Return False if canceled.
+    def walk(self, tu):
+        self.translationunit = tu
+        self.visitor = clang.cindex.callbacks['cursor_visit'](self._visit_child)
+        self.mapHashToWalked = {}
+        mapHashToWalked = self.mapHashToWalked
+        hashes = self.hashes
+        pathFilter = self.pathFilter
+        if pathFilter is not None:
+            pathFilter.set_translationunit(tu)
+        root = tu.cursor
+        node = self._add_node(root, -1, 0)
+        stack = [[self._get_children(root), node, 0, -1, 0, 0]]
+        while stack:
+            if self.canceled:
+                break
+            entry = stack[-1]
+            children, parent, idx, lastChild, below, maxDeep = entry
+            if idx == len(children):    # all children visited
+                deep = len(stack)
+                stack.pop()
+                if lastChild >= 0:      # may be shared by the following nodes of the same cursor
+                    mapHashToWalked.setdefault(hashes[parent], (parent, below, maxDeep - deep + 1))
+                if stack:
+                    parentEntry = stack[-1]
+                    parentEntry[4] = parentEntry[4] + 1 + below
+                    if maxDeep > parentEntry[5]:
+                        parentEntry[5] = maxDeep
+                if idx > 0:
+                    if idx > self.cntMaxChildren:
+                        self.cntMaxChildren = idx
+                    if deep > self.cntMaxDeep:
+                        self.cntMaxDeep = deep
+                continue
+            entry[2] = idx + 1
+            childCursor = children[idx]
+            if (pathFilter is not None) and not pathFilter.accept(childCursor):
+                continue
+            node = self._add_node(childCursor, parent, len(stack))
+            if lastChild < 0:
+                self.firstChilds[parent] = node
+            else:
+                self.nextSiblings[lastChild] = node
+            entry[3] = node
+            walked = mapHashToWalked.get(hashes[node])
+            if (walked is not None) and self._is_same_cursor(walked[0], self.kindIds[node],
+                                                             self._get_raw_data(node), childCursor):
+                origin, originBelow, originHeight = walked
+                self.mapSharedToOrigin[node] = origin
+                self.mapOriginToSharers.setdefault(origin, []).append(node)
+                self.cntShared = self.cntShared + 1
+                self.cntCursors = self.cntCursors + originBelow
+                entry[4] = entry[4] + 1 + originBelow
+                deep = len(stack) + originHeight
+                if deep > entry[5]:
+                    entry[5] = deep
+                if deep > self.cntMaxDeep:
+                    self.cntMaxDeep = deep
+                continue
+            stack.append([self._get_children(childCursor), node, 0, -1, 0, len(stack)])
+        self.visitor = None
+        self.visitedChildren = None
+        self.mapHashToWalked = None
+        self._create_doubles()
+        return not self.canceled
+
+    # Find all doubles, nodes of the same cursor found several times in AST.
+    # Nodes are sorted by hash, so only nodes with the same hash need to be compared.
+    def _create_doubles(self):
+        hashes = self.hashes
+        order = sorted(range(len(hashes)), key=hashes.__getitem__)
+        self.hashOrder = array.array('l', order)
+        self.sortedHashes = array.array('L', (hashes[node] for node in order))
+        self.hashes = array.array('L')
+        groups = []
+        start = 0
+        cnt = len(order)
+        while start < cnt:
+            end = start + 1
+            while (end < cnt) and (self.sortedHashes[end] == self.sortedHashes[start]):
+                end = end + 1
+            if (end - start) > 1:       # same hash, but maybe not the same cursor
+                sameCursors = []        # lists of nodes with equal cursors
+                for node in order[start:end]:
+                    rawData = self._get_raw_data(node)
+                    for nodes in sameCursors:
+                        if self._is_same_cursor(nodes[0], self.kindIds[node], rawData):
+                            nodes.append(node)
+                            break
+                    else:
+                        sameCursors.append([node])
+                groups.extend(nodes for nodes in sameCursors if len(nodes) > 1)
+                self.cntHashCollisions = self.cntHashCollisions + len(sameCursors) - 1
+            start = end
+
+        positions = self._count_positions()
+        doubleKeys = []
+        for group, nodes in enumerate(groups):
+            self.doubleNodes.extend(nodes)
+            self.doubleStarts.append(len(self.doubleNodes))
+            doubleKeys.extend((node, group) for node in nodes)
+            self._count_doubles(sum(positions[node] for node in nodes))
+        if self.mapOriginToSharers:     # single cursors inside shared children
+            grouped = set(node for node, group in doubleKeys)
+            for node, cnt in enumerate(positions):
+                if (cnt > 1) and (node not in grouped):
+                    self._count_doubles(cnt)
+        doubleKeys.sort()
+        self.doubleKeys.extend(node for node, group in doubleKeys)
+        self.doubleGroups.extend(group for node, group in doubleKeys)
+
+    # Add a cursor found at cnt positions to the statistics of doubles.
+    def _count_doubles(self, cnt):
+        self.cntDouble = self.cntDouble + cnt - 1
+        if cnt > self.cntMaxDoubles:
+            self.cntMaxDoubles = cnt
+
+    # Return array with the number of positions of each walked node in the AST.
+    # Nodes inside shared children are found below their parent and below all nodes sharing
+    # the children of their parent, see _get_occurrences. No copies are created for this.
+    def _count_positions(self):
+        cnt = len(self.parents)
+        if not self.mapOriginToSharers:
+            return array.array('l', (1,)) * cnt
+        parents = self.parents
+        mapOriginToSharers = self.mapOriginToSharers
+        positions = array.array('l', (0,)) * cnt
+        positions[0] = 1
+        for node in range(1, cnt):
+            if positions[node] > 0:
+                continue
+            parent = parents[node]
+            if (positions[parent] > 0) and (parent not in mapOriginToSharers):
+                positions[node] = positions[parent]   # parents are walked before their children
+                continue
+            stack = [node]
+            while stack:
+                cur = stack[-1]
+                if positions[cur] > 0:
+                    stack.pop()
+                    continue
+                parent = parents[cur]
+                sources = [parent]
+                sources.extend(mapOriginToSharers.get(parent, ()))
+                missing = [n for n in sources if positions[n] == 0]
+                if missing:
+                    stack.extend(missing)
+                    continue
+                positions[cur] = sum(positions[n] for n in sources)
+                stack.pop()
+        return positions
+
+    # Return raw data (CXCursor) of node id as bytes.
+    def _get_raw_data(self, node):
+        start = node * CursorTree._CURSOR_SIZE
+        return bytes(self.cursorData[start:start+CursorTree._CURSOR_SIZE])
+
+    # Compare cursor of node with a cursor given by its kind id and raw data,
+    # return True if both are the same cursor.
+    # clang_equalCursors compares kind and data[] of both cursors, but ignores data[1]
+    # of declarations. So only declarations with same kind, data[0] and data[2]
+    # but different data[1] are compared by libclang.
+    # cursor is the Cursor object of rawData if available.
+    def _is_same_cursor(self, node, kindId, rawData, cursor=None):
+        if self.kindIds[node] != kindId:
+            self.cntFastCompares = self.cntFastCompares + 1
+            return False
+        nodeData = self._get_raw_data(node)
+        if nodeData[CursorTree._DATA_START:] == rawData[CursorTree._DATA_START:]:
+            self.cntFastCompares = self.cntFastCompares + 1
+            return True
+        isDecl = self.mapKindIdToIsDecl.get(kindId)
+        if isDecl is None:
+            isDecl = clang.cindex.CursorKind.from_id(kindId).is_declaration()
+            self.mapKindIdToIsDecl[kindId] = isDecl
+        if ((not isDecl)
+            or (nodeData[CursorTree._DATA_START:CursorTree._DATA1_START]
+                != rawData[CursorTree._DATA_START:CursorTree._DATA1_START])
+            or (nodeData[CursorTree._DATA2_START:] != rawData[CursorTree._DATA2_START:])):
+            self.cntFastCompares = self.cntFastCompares + 1
+            return False
+        self.cntLibCompares = self.cntLibCompares + 1
+        if cursor is None:
+            cursor = clang.cindex.Cursor.from_buffer_copy(rawData)
+        return self.get_cursor(node) == cursor
+
+    # Set all statistics in Metrics m.
+    def set_counts(self, m):
+        m.set_count('cursors', self.cntCursors)
+        m.set_count('doubles', self.cntDouble)
+        m.set_count('max doubles', self.cntMaxDoubles)
+        m.set_count('max children', self.cntMaxChildren)
+        m.set_count('max depth', self.cntMaxDeep)
+        m.set_count('shared subtrees', self.cntShared)
+        m.set_count('copied cursors', self.cntCopies)
+        m.set_count('hash collisions', self.cntHashCollisions)
+        m.set_count('fast compares', self.cntFastCompares)
+        m.set_count('libclang compares', self.cntLibCompares)
+
+    # Return the Cursor of node id or IID.
+    def get_cursor(self, node):
+        node = int(node)
+        if (node < 0) or (node >= len(self.parents)):
+            return None
+        cursor = clang.cindex.Cursor.from_buffer_copy(self.cursorData, node * CursorTree._CURSOR_SIZE)
+        cursor._tu = self.translationunit
+        return cursor
+
+    # Return IID of parent, '' for root.
+    def get_parent_iid(self, iid):
+        parent = self.parents[int(iid)]
+        if parent < 0:
+            return ''
+        return str(parent)
+
+    def has_children(self, iid):
+        node = int(iid)
+        return (self.firstChilds[node] >= 0) or (node in self.mapSharedToOrigin)
+
+    # Append a copy of the walked node origin as new last child of parent, return its node id.
+    def _add_copy(self, origin, parent):
+        node = len(self.parents)
+        start = origin * CursorTree._CURSOR_SIZE
+        self.cursorData.extend(self.cursorData[start:start+CursorTree._CURSOR_SIZE])
+        self.parents.append(parent)
+        self.firstChilds.append(-1)
+        self.nextSiblings.append(-1)
+        self.depths.append(self.depths[parent] + 1)
+        self.kindIds.append(self.kindIds[origin])
+        self.spellingIds.append(self.spellingIds[origin])
+        self.mapCopyToOrigin[node] = origin
+        self.mapOriginToCopies.setdefault(origin, []).append(node)
+        shared = self.mapSharedToOrigin.get(origin)
+        if shared is not None:
+            self.mapSharedToOrigin[node] = shared
+        elif self.firstChilds[origin] >= 0:
+            self.mapSharedToOrigin[node] = origin
+        self.cntCopies = self.cntCopies + 1
+        return node
+
+    # Create copies of all children shared by node.
+    def _copy_children(self, node):
+        lastCopy = -1
+        child = self.firstChilds[self.mapSharedToOrigin[node]]
+        while child >= 0:
+            copy = self._add_copy(child, node)
+            if lastCopy < 0:
+                self.firstChilds[node] = copy
+            else:
+                self.nextSiblings[lastCopy] = copy
+            lastCopy = copy
+            child = self.nextSiblings[child]
+
+    # Return node id of child number idx of node, shared children are copied if needed.
+    def _get_child(self, node, idx):
+        if (self.firstChilds[node] < 0) and (node in self.mapSharedToOrigin):
+            self._copy_children(node)
+        child = self.firstChilds[node]
+        for n in range(idx):
+            child = self.nextSiblings[child]
+        return child
+
+    # Return index of node in the children of its parent.
+    def _get_child_index(self, node):
+        idx = 0
+        child = self.firstChilds[self.parents[node]]
+        while child != node:
+            child = self.nextSiblings[child]
+            idx = idx + 1
+        return idx
+
+    # Return node ids of all positions of walked node in the AST including the positions
+    # inside shared children, missing copies are created.
+    # The children of a walked node are found below all positions of this node
+    # and below all positions of the nodes sharing them.
+    # The positions of all handled walked nodes are kept in mapNodeToPositions,
+    # it's used instead of recursion because the AST may be very deep.
+    def _get_occurrences(self, node):
+        occurrences = self.mapNodeToPositions
+        stack = [node]
+        while stack:
+            cur = stack[-1]
+            if cur in occurrences:
+                stack.pop()
+                continue
+            parent = self.parents[cur]
+            if parent < 0:
+                occurrences[cur] = [cur]
+                stack.pop()
+                continue
+            parents = [parent]
+            parents.extend(self.mapOriginToSharers.get(parent, ()))
+            missing = [n for n in parents if n not in occurrences]
+            if missing:
+                stack.extend(missing)
+                continue
+            parentPositions = []
+            for n in parents:
+                parentPositions.extend(occurrences[n])
+            if len(parentPositions) == 1:
+                occurrences[cur] = [cur]
+            else:
+                idx = self._get_child_index(cur)
+                occurrences[cur] = [self._get_child(n, idx) for n in parentPositions]
+            stack.pop()
+        return occurrences[node]
+
+    # Return list of node ids from root to node, sorting these lists sorts nodes in AST order
+    # also if there are copies.
+    def _get_path(self, node):
+        path = []
+        while node >= 0:
+            path.append(node)
+            node = self.parents[node]
+        path.reverse()
+        return path
+
+    # Return list of IIDs of all children.
+    # Shared children are copied on first call.
+    def get_child_iids(self, iid):
+        childIIDs = []
+        node = int(iid)
+        if (self.firstChilds[node] < 0) and (node in self.mapSharedToOrigin):
+            self._copy_children(node)
+        node = self.firstChilds[node]
+        while node >= 0:
+            childIIDs.append(str(node))
+            node = self.nextSiblings[node]
+        return childIIDs
+
+    # Return all IIDs of the same cursor as iid in AST order as list
+    # or a single IID if there are no doubles.
+    # Positions inside shared children are included, missing copies are created.
+    def get_double_iids(self, iid):
+        node = int(iid)
+        node = self.mapCopyToOrigin.get(node, node)
+        nodes = (node,)
+        idx = bisect.bisect_left(self.doubleKeys, node)
+        if (idx < len(self.doubleKeys)) and (self.doubleKeys[idx] == node):
+            group = self.doubleGroups[idx]
+            nodes = self.doubleNodes[self.doubleStarts[group]:self.doubleStarts[group+1]]
+        if self.mapOriginToSharers:
+            positions = []
+            for double in nodes:
+                positions.extend(self._get_occurrences(double))
+            nodes = sorted(positions, key=self._get_path)
+        if len(nodes) == 1:
+            return iid
+        return [str(node) for node in nodes]
+
+    # Return all IIDs of cursor as list or a single IID if there are no doubles,
+    # None if cursor is not part of the AST.
+    # The found node is cached by the raw data of cursor, so libclang is only asked
+    # the first time a cursor is searched.
+    def find_iids(self, cursor):
+        if self.sortedHashes is None:
+            return None
+        rawData = ctypes.string_at(ctypes.addressof(cursor), CursorTree._CURSOR_SIZE)
+        found = self.mapRawToNode.get(rawData)
+        if found is None:
+            found = -1
+            kindId = cursor._kind_id
+            cursorHash = cursor.hash
+            idx = bisect.bisect_left(self.sortedHashes, cursorHash)
+            while (idx < len(self.sortedHashes)) and (self.sortedHashes[idx] == cursorHash):
+                node = self.hashOrder[idx]
+                if self._is_same_cursor(node, kindId, rawData, cursor):
+                    found = node
+                    break
+                idx = idx + 1
+            self.mapRawToNode[rawData] = found
+        if found < 0:
+            return None
+        return self.get_double_iids(str(found))
+
+    # Return ids of all spellings which may match to a regular expression.
+    # A trigram index is used to skip spellings not containing all literals of the expression.
+    # This index is created on first use.
+    def _get_regex_candidates(self, pattern):
+        trigrams = set()
+        for literal in get_regex_literals(pattern):
+            trigrams.update(get_trigrams(literal))
+        if not trigrams:
+            return range(len(self.spellings))
+
+        if self.mapTrigramToSpellingIds is None:
+            self.mapTrigramToSpellingIds = {}
+            for spellingId, spelling in enumerate(self.spellings):
+                for trigram in get_trigrams(spelling.lower()):
+                    self.mapTrigramToSpellingIds.setdefault(trigram, set()).add(spellingId)
+
+        candidates = None
+        for trigram in trigrams:
+            spellingIds = self.mapTrigramToSpellingIds.get(trigram)
+            if not spellingIds:
+                return []
+            if candidates is None:
+                candidates = set(spellingIds)
+            else:
+                candidates.intersection_update(spellingIds)
+        return candidates
+
+    # Search for IIDs of Cursors with given spelling, see ASTOutputFrame.search.
+    # If cursorKind is not None only Cursors of this kind (name) are found.
+    # reObj is a compiled regular expression used instead of spelling if not None.
+    def search(self, spelling, caseInsensitive=False, reObj=None, cursorKind=None):
+        nodes = []
+        if reObj is not None:
+            for spellingId in self._get_regex_candidates(reObj.pattern):
+                if reObj.match(self.spellings[spellingId]):
+                    nodes.extend(self.spellingNodes[spellingId])
+        elif caseInsensitive:
+            for spellingId in self.mapLowerSpellingToIds.get(spelling.lower(), []):
+                nodes.extend(self.spellingNodes[spellingId])
+        else:
+            spellingId = self.mapSpellingToId.get(spelling)
+            if spellingId is not None:
+                nodes.extend(self.spellingNodes[spellingId])
+
+        if cursorKind is not None:
+            kindId = getattr(clang.cindex.CursorKind, cursorKind).value
+            kindIds = self.kindIds
+            nodes = [node for node in nodes if kindIds[node] == kindId]
+
+        if self.mapOriginToSharers:
+            # also find all positions inside shared children
+            allNodes = []
+            for node in nodes:
+                allNodes.extend(self._get_occurrences(node))
+            nodes = sorted(set(allNodes), key=self._get_path)
+        else:
+            nodes.sort()
+        return [str(node) for node in nodes]
+
+
 # Widget to show the AST in a Treeview like folders in a file browser
 # This widget is the master for current selected Cursor object.
 # If you want to show an other Cursor call set_current_cursor(...)
+# In lazy mode only the first level of the AST is inserted in the Treeview, children of a node
+# are inserted the first time it is opened. The whole AST is still walked (see CursorTree)
+# so all IIDs and Cursors are known even if not shown yet.
+# Children are not inserted at once but in small chunks from the Tk event loop (see InsertJob),
+# so the Treeview stays usable even while a node with many children is filled.
 class ASTOutputFrame(ttk.Frame):
-    def __init__(self, master=None, selectCmd=None):
+    def __init__(self, master=None, selectCmd=None, lazy=True):
         ttk.Frame.__init__(self, master)
         self.grid(sticky='nswe')
         self._create_widgets()
         self.translationunit = None
-        self.mapIIDtoCursor = {}        # Treeview use IIDs (stings) to identify a note,
-        self.mapCursorToIID = {}        # so we need to map between IID and Cursor in both direction.
-                                        # One Cursor may have a list of IIDs if several times found in AST.
+        self.cursorTree = None          # current CursorTree, maps IIDs to Cursors
+        self.shownIIDs = set()          # IIDs whose children are already inserted in Treeview
         self.selectCmd = selectCmd      # Callback after selecting a Cursor
+        self.lazy = lazy                # insert children on first open of a node
+        self.insertJobs = collections.deque()   # pending InsertJobs in processing order
+        self.mapIIDToJob = {}           # parent IID -> its pending InsertJob
+        self.insertAfterID = None       # ID of scheduled _insert_chunk
+        self.cntInserted = 0            # number of Cursors inserted in Treeview
+        self.cntWaiting = 0             # number of Cursors still waiting in InsertJobs
+
+    _DUMMY_SUFFIX = '-'                 # IID suffix for placeholder children of unopened nodes
+    _CHUNK_TIME = 0.016                 # max. time in s for inserting one chunk of nodes
 
     def _create_widgets(self):
         self.rowconfigure(0, weight=1)
@@ -496,16 +2012,32 @@ class ASTOutputFrame(ttk.Frame):
         self.astView = ttk.Treeview(self, selectmode='browse')
         self.astView.tag_configure('default', font='TkFixedFont')
         self.astView.bind('<<TreeviewSelect>>', self._on_selection)
+        self.astView.bind('<<TreeviewOpen>>', self._on_open)
 
         make_scrollable(self, self.astView)
 
         self.astView.heading('#0', text='Cursor')
         self.astView.grid(row=0, column=0, sticky='nswe')
 
+        self.statusValue = tk.StringVar(value='')
+        statusLabel = ttk.Label(self, textvariable=self.statusValue)
+        statusLabel.grid(row=2, column=0, columnspan=2, sticky='w')
+
     def _on_selection(self, event):
         if self.selectCmd is not None:
             self.selectCmd()
 
+    # A node was opened, insert its children if not done yet.
+    # Children of this node are inserted before all other waiting nodes.
+    def _on_open(self, event):
+        iid = self.astView.focus()
+        if iid:
+            self._show_children(iid)
+            job = self.mapIIDToJob.get(iid)
+            if (job is not None) and (self.insertJobs[0] is not job):
+                self.insertJobs.remove(job)
+                self.insertJobs.appendleft(job)
+
     def set_select_cmd(self, cmd):
         self.selectCmd = cmd
 
@@ -514,88 +2046,169 @@ class ASTOutputFrame(ttk.Frame):
 
     # Return a single IID or a list of IIDs.
     def get_current_iids(self):
-        cursor = self.get_current_cursor()
-        if cursor is not None:
-            return self.mapCursorToIID[HashableObj(cursor)]
+        curItem = self.astView.focus()
+        if curItem and (self.cursorTree is not None):
+            return self.cursorTree.get_double_iids(curItem)
         else:
             return None
 
     def get_current_cursor(self):
         curCursor = None
         curItem = self.astView.focus()
-        if curItem:
-            curCursor = self.mapIIDtoCursor[curItem]
+        if curItem and (self.cursorTree is not None):
+            curCursor = self.cursorTree.get_cursor(curItem)
         return curCursor
 
     def set_current_iid(self, iid):
+        self._show_iid(iid)
         self.astView.focus(iid)
         self.astView.selection_set(iid)
         self.astView.see(iid)
 
     def set_current_cursor(self, cursor):
-        iid = self.mapCursorToIID[HashableObj(cursor)]
-        if isinstance(iid, list): # partly multimap
+        if self.cursorTree is None:
+            return
+        iid = self.cursorTree.find_iids(cursor)
+        if iid is None:         # not part of AST
+            return
+        if isinstance(iid, list): # doubles
             iid = iid[0]
         self.set_current_iid(iid)
 
     def clear(self):
+        if self.insertAfterID is not None:
+            self.after_cancel(self.insertAfterID)
+            self.insertAfterID = None
+        self.insertJobs = collections.deque()
+        self.mapIIDToJob = {}
+        self.cntInserted = 0
+        self.cntWaiting = 0
+        self.statusValue.set('')
         for i in self.astView.get_children():
             self.astView.delete(i)
         self.translationunit = None
-        self.mapIIDtoCursor = {}
-        self.mapCursorToIID = {}
-
-    def _insert_children(self, cursor, iid, deep=1):
-        cntChildren = 0
-        for childCursor in cursor.get_children():
-            cntChildren = cntChildren + 1
-            newIID = self.astView.insert(iid,
-                                        'end',
-                                        text=toStr(childCursor),
-                                        tags=['default'])
-            self.mapIIDtoCursor[newIID] = childCursor
-            hCursor = HashableObj(childCursor)
-            if hCursor in self.mapCursorToIID: # already in map, make a partly multimap
-                self.cntDouble = self.cntDouble + 1
-                data = self.mapCursorToIID[hCursor]
-                if isinstance(data, str):
-                    data = [data]
-                    self.mapCursorToIID[hCursor] = data
-                data.append(newIID)
-                if len(data) > self.cntMaxDoubles:
-                    self.cntMaxDoubles = len(data)
+        self.cursorTree = None
+        self.shownIIDs = set()
+
+    # Insert a single IID in Treeview at index (position between already inserted siblings).
+    # If it has children add a placeholder so it can be opened before the children are inserted,
+    # without placeholder the children are inserted later.
+    def _insert_iid(self, parentIID, iid, placeholder=True, index='end'):
+        self.astView.insert(parentIID,
+                            index,
+                            iid=iid,
+                            text=toStr(self.cursorTree.get_cursor(iid)),
+                            tags=['default'])
+        self.cntInserted = self.cntInserted + 1
+        if self.cursorTree.has_children(iid):
+            if placeholder:
+                self.astView.insert(iid, 'end', iid=join(iid, ASTOutputFrame._DUMMY_SUFFIX))
             else:
-                self.mapCursorToIID[hCursor] = newIID
-            self._insert_children(childCursor, newIID, deep+1)
-            self.cntCursors = self.cntCursors + 1
+                self._show_children(iid, False)
 
-        if cntChildren > 0:
-            if cntChildren > self.cntMaxChildren:
-                self.cntMaxChildren = cntChildren
-            if deep > self.cntMaxDeep:
-                self.cntMaxDeep = deep
-
-    def set_translationunit(self, tu):
-        self.cntCursors = 1
-        self.cntDouble = 0
-        self.cntMaxDoubles = 0
-        self.cntMaxChildren = 0
-        self.cntMaxDeep = 0
+    # Insert all children of iid in Treeview (replace the placeholder).
+    # iid must be still inserted. The children are only queued, see _insert_chunk.
+    def _show_children(self, iid, placeholder=True):
+        if iid in self.shownIIDs:
+            return
+        self.shownIIDs.add(iid)
+        childIIDs = self.cursorTree.get_child_iids(iid)
+        if childIIDs:
+            dummyIID = join(iid, ASTOutputFrame._DUMMY_SUFFIX)
+            if self.astView.exists(dummyIID):
+                self.astView.delete(dummyIID)
+            job = InsertJob(iid, childIIDs, placeholder)
+            self.insertJobs.append(job)
+            self.mapIIDToJob[iid] = job
+            self.cntWaiting = self.cntWaiting + len(childIIDs)
+            if self.insertAfterID is None:
+                self.insertAfterID = self.after_idle(self._insert_chunk)
+
+    # Insert the next child of job, return False if there is none left.
+    def _insert_job_next(self, job):
+        while job.nextIdx < len(job.childIIDs):
+            idx = job.nextIdx
+            job.nextIdx = idx + 1
+            if idx in job.earlyIdxs:    # still inserted by _insert_job_child
+                continue
+            self.cntWaiting = self.cntWaiting - 1
+            self._insert_iid(job.parentIID, job.childIIDs[idx], job.placeholder, idx)
+            return True
+        return False
+
+    # Insert the child with index childIdx of job before its turn.
+    # All children before are already inserted or have been inserted early too,
+    # so its position in Treeview can be calculated.
+    def _insert_job_child(self, job, childIdx):
+        if (childIdx < job.nextIdx) or (childIdx in job.earlyIdxs):
+            return
+        pos = bisect.bisect_left(job.earlyIdxList, childIdx)
+        earlyBefore = pos - bisect.bisect_left(job.earlyIdxList, job.nextIdx)
+        job.earlyIdxList.insert(pos, childIdx)
+        job.earlyIdxs.add(childIdx)
+        self.cntWaiting = self.cntWaiting - 1
+        self._insert_iid(job.parentIID, job.childIIDs[childIdx], job.placeholder,
+                         job.nextIdx + earlyBefore)
+
+    # Insert queued children until the time of one chunk is over,
+    # than give the event loop a chance and continue later.
+    # insertAfterID is kept while running, so inserted nodes don't schedule a second call.
+    def _insert_chunk(self):
+        startTime = time.time()
+        endTime = startTime + ASTOutputFrame._CHUNK_TIME
+        jobs = self.insertJobs
+        while jobs:
+            job = jobs[0]
+            if not self._insert_job_next(job):
+                jobs.popleft()
+                del self.mapIIDToJob[job.parentIID]
+            elif time.time() > endTime:
+                break
+        metrics.add_time('treeview insert', time.time() - startTime)
+        if jobs:
+            self.statusValue.set('Inserting cursors: {0} inserted, {1} waiting'.format(
+                self.cntInserted, self.cntWaiting))
+            self.insertAfterID = self.after_idle(self._insert_chunk)
+        else:
+            self.insertAfterID = None
+            self.statusValue.set('{0} of {1} cursors inserted'.format(
+                self.cntInserted, self.cursorTree.cntCursors))
+
+    # Make sure iid is inserted in Treeview, so also insert all missing parents.
+    # Parents waiting in an InsertJob are inserted before all other waiting nodes.
+    def _show_iid(self, iid):
+        path = []
+        curIID = iid
+        while curIID != '0':
+            path.append(curIID)
+            curIID = self.cursorTree.get_parent_iid(curIID)
+        parentIID = '0'
+        for curIID in reversed(path):
+            self._show_children(parentIID)
+            job = self.mapIIDToJob.get(parentIID)
+            if job is not None:
+                self._insert_job_child(job, job.childIIDs.index(curIID))
+            parentIID = curIID
+
+    # Insert the complete subtree of iid in Treeview.
+    def _show_all_children(self, iid):
+        self._show_children(iid, False)
+
+    # Show the AST of tu. cursorTree may contain the still walked AST of tu.
+    def set_translationunit(self, tu, cursorTree=None):
         self.clear()
+        if cursorTree is None:
+            cursorTree = CursorTree()
+            cursorTree.walk(tu)
         self.translationunit = tu
-        root = tu.cursor
-        iid = self.astView.insert('',
-                                  'end',
-                                  text=toStr(root),
-                                  tags=['default'])
-        self.mapIIDtoCursor[iid] = root
-        self.mapCursorToIID[HashableObj(root)] = iid
-        self._insert_children(root, iid)
-
-        # some statistics
-        print('AST has {0} cursors including {1} doubles.'.format(self.cntCursors, self.cntDouble))
-        print('max doubles: {0}, max children {1}, max deep {2}'.format(
-            self.cntMaxDoubles, self.cntMaxChildren, self.cntMaxDeep))
+        self.cursorTree = cursorTree
+
+        iid = '0'
+        self._insert_iid('', iid, self.lazy)
+        if self.lazy:
+            self._show_children(iid)
+        else:
+            self._show_all_children(iid)
 
     # Search for IIDs matching to Cursors matching to kwargs.
     def search(self, **kwargs):
@@ -614,31 +2227,74 @@ class ASTOutputFrame(ttk.Frame):
             except Exception as e:
                 tkMessageBox.showerror('Search RegEx', str(e))
                 return result
-        elif caseInsensitive:
-            spelling = spelling.lower()
-
-        for iid in self.mapIIDtoCursor:
-            cursor = self.mapIIDtoCursor[iid]
-            found = True
-            if useCursorKind:
-                found = cursorKind == cursor.kind.name
-            if found:
-                if useRegEx:
-                    if not reObj.match(toStr(cursor.spelling)):
-                        found = False
-
-                elif caseInsensitive:
-                    found = spelling == toStr(cursor.spelling).lower()
-                else:
-                    found = spelling == toStr(cursor.spelling)
-            if found:
-                result.append(iid)
+        else:
+            reObj = None
+        if not useCursorKind:
+            cursorKind = None
 
-        result.sort()
+        if self.cursorTree is not None:
+            startTime = time.time()
+            result = self.cursorTree.search(spelling, caseInsensitive, reObj, cursorKind)
+            metrics.add_time('search', time.time() - startTime)
 
         return result
 
 
+# Children of one Treeview node waiting to be inserted by ASTOutputFrame.
+# Children are inserted in order, but single children can be inserted early
+# (e.g. to show a selected node), the following children are inserted before them.
+class InsertJob:
+    def __init__(self, parentIID, childIIDs, placeholder):
+        self.parentIID = parentIID
+        self.childIIDs = childIIDs
+        self.placeholder = placeholder  # add placeholder for children of children
+        self.nextIdx = 0                # next child to insert in order
+        self.earlyIdxs = set()          # index of children inserted early ...
+        self.earlyIdxList = []          # ... and as sorted list
+
+
+# Text and tags collected to insert it at once into a Text widget.
+# Inserting text piece by piece and adding each tag separately needs a lot of calls to Tk,
+# TextBuffer needs just one insert and one tag_add per tag.
+# Positions are Text widget indexes like "line.column" starting at "1.0".
+class TextBuffer:
+    def __init__(self, line=1):
+        self.chunks = []
+        self.line = line        # current position (end of text), text starts at beginning of line
+        self.column = 0
+        self.tagRanges = {}     # tag -> list of start and end indexes
+
+    def index(self):
+        return '{0}.{1}'.format(self.line, self.column)
+
+    # Append text with a single tag or a list of tags.
+    def insert(self, text, tags=None):
+        startIdx = self.index()
+        self.chunks.append(text)
+        newLines = text.count('\n')
+        if newLines > 0:
+            self.line = self.line + newLines
+            self.column = len(text) - text.rfind('\n') - 1
+        else:
+            self.column = self.column + len(text)
+        if tags:
+            if isinstance(tags, str):
+                tags = (tags,)
+            endIdx = self.index()
+            for tag in tags:
+                self.tag_add(tag, startIdx, endIdx)
+
+    def tag_add(self, tag, startIdx, endIdx):
+        self.tagRanges.setdefault(tag, []).extend((startIdx, endIdx))
+
+    # Insert all text and tags into textWidget at index,
+    # this must be the beginning of the line given at creation.
+    def apply(self, textWidget, index='end'):
+        textWidget.insert(index, ''.join(self.chunks))
+        for tag, ranges in self.tagRanges.items():
+            textWidget.tag_add(tag, *ranges)
+
+
 # Helper class to represent un-/folded sections in Text widget of CursorOutputFrame.
 # One node is of type FoldSection.
 # No Node will be removed even if a new selected cursor object have less section.
@@ -663,6 +2319,8 @@ class FoldSectionTree:
     def __init__(self):
         self.root = FoldSection(True)   # just a root node witch is always shown
         self.marker = None              # a singe section header (attribute name) can be highlighted
+        self.lines = []                 # start lines of all active sections, sorted ...
+        self.sections = []              # ... and the matching sections
 
     def get_root(self):
         return self.root
@@ -680,40 +2338,57 @@ class FoldSectionTree:
     # Deactivate all section but do not erase it, they still know if they should be shown or not.
     def clear_lines(self):
         self.root.clear_lines()
+        self.lines = []
+        self.sections = []
+
+    # Activate section sec starting at startLine in Text widget.
+    # Sections must be added in line order, see also insert_body.
+    def add_section(self, sec, startLine):
+        sec.set_line(startLine)
+        self.lines.append(startLine)
+        self.sections.append(sec)
+
+    # Return a list of all active sections in line order.
+    def get_sections(self):
+        return list(self.sections)
+
+    # Add the body of active section sec later, so all following sections are moved.
+    # createBody must add all sections of the body and return the number of new lines.
+    def insert_body(self, sec, createBody):
+        idx = bisect.bisect_right(self.lines, sec.startLine)
+        movedLines = self.lines[idx:]
+        movedSecs = self.sections[idx:]
+        del self.lines[idx:]
+        del self.sections[idx:]
+        newLines = createBody()
+        for s in movedSecs:
+            s.move_lines(newLines)
+        self.lines.extend(line + newLines for line in movedLines)
+        self.sections.extend(movedSecs)
+        parent = sec.parent
+        while parent is not None:   # parents contain the new lines
+            parent.set_end_line(parent.endLine + newLines)
+            parent = parent.parent
 
     # Find section starting at startLine in Text widget.
     def find_section(self, startLine):
-        return self._find_section(startLine, self.root.members)
-
-    def _find_section(self, startLine, sectionList):
-        if sectionList:
-            lastSec = None
-            for sec in sectionList:
-                if sec.startLine == 0:
-                    break
-                elif sec.startLine == startLine:
-                    return sec
-                elif sec.startLine < startLine:
-                    lastSec = sec
-                else:
-                    break
-            if lastSec is not None:
-                return self._find_section(startLine, lastSec.members)
-            else:
-                return None
-        else:
-            return None
+        idx = bisect.bisect_left(self.lines, startLine)
+        if (idx < len(self.lines)) and (self.lines[idx] == startLine):
+            return self.sections[idx]
+        return None
 
 
 # Node in FoldSectionTree
 class FoldSection:
     def __init__(self, show, deep=-1):
         self.startLine = 0      # if 0 this section is not active
+        self.endLine = 0        # body of this section are all lines after startLine before endLine
         self.show = show        # fold or not
         self.members = None     # children
         self.parent = None
         self.childNr = -1       # child index from parent view
         self.deep = deep        # current deep in tree, root is -1, first real sections 0
+        self.render = None      # function to create the output if not done yet (only for hidden sections)
 
     show_default = False # default section are closed
 
@@ -721,10 +2396,28 @@ class FoldSection:
     # This also activate this section (startLine > 0).
     def set_line(self, startLine):
         self.startLine = startLine
+        self.endLine = startLine + 1
+
+    def set_end_line(self, endLine):
+        self.endLine = endLine
+
+    # Move this section by lines.
+    def move_lines(self, lines):
+        self.startLine += lines
+        self.endLine += lines
+
+    # Return Text widget indexes of the [+]/[-] sign in header and the start and end of the body.
+    def get_indexes(self):
+        return ('{0}.{1}'.format(self.startLine, self.deep+1),  # header starts after deep tabs
+                '{0}.0'.format(self.startLine+1),
+                '{0}.0'.format(self.endLine))
 
     def set_show(self, show):
         self.show = show
 
+    def set_render(self, render):
+        self.render = render
+
     # Open this an all children sections.
     def set_all_show(self, show):
         self.show = show
@@ -750,6 +2443,8 @@ class FoldSection:
     # Deactivate this section and all children.
     def clear_lines(self):
         self.startLine = 0
+        self.endLine = 0
+        self.render = None
         if self.members:
             for m in self.members:
                 m.clear_lines()
@@ -769,8 +2464,9 @@ class CursorOutputFrame(ttk.Frame):
         self._create_widgets()
         self.cursor = None
         self.selectCmd = selectCmd              # will be called on clicking a cursor link
-        self.cursorList = []                    # list of cursor in same order as links are shown in text
+        self.cursorList = []                    # cursors of all links, link n has tag link_n
         self.foldTree = FoldSectionTree()       # contains infos about foldable section (a single member)
+        self.textBuffer = None                  # output is collected here before shown in cursorText
 
     _MAX_DEEP = 8               # max deep of foldable sections / attributes
     _MAX_ITER_OUT = 25          # is a member is an iterator show just the first x elements
@@ -779,6 +2475,31 @@ class CursorOutputFrame(ttk.Frame):
     # ignore member with this types
     _IGNORE_TYPES = ('function',)
 
+    # Reflection data is the same for all objects of a class, so it is only created once per class.
+    _attrNamesCache = {}        # class -> names of all attributes not starting with '_'
+    _methodeInfoCache = {}      # (class, attribute name) -> (prototype, is simple methode)
+
+    # Return names of all attributes of obj to show.
+    @staticmethod
+    def _get_attr_names(obj):
+        cls = obj.__class__
+        attrNames = CursorOutputFrame._attrNamesCache.get(cls)
+        if attrNames is None:
+            attrNames = [attrName for attrName in dir(obj) if attrName[0] != '_']
+            CursorOutputFrame._attrNamesCache[cls] = attrNames
+        return attrNames
+
+    # Return tuple (prototype, is simple methode) for methode attribute attrName of obj.
+    # methode is the value of this attribute.
+    @staticmethod
+    def _get_methode_info(obj, attrName, methode):
+        key = (obj.__class__, attrName)
+        info = CursorOutputFrame._methodeInfoCache.get(key)
+        if info is None:
+            info = (get_methode_prototype(methode), is_simple_instance_methode(methode))
+            CursorOutputFrame._methodeInfoCache[key] = info
+        return info
+
     def _create_widgets(self):
         self.rowconfigure(0, weight=1)
         self.columnconfigure(0, weight=1)
@@ -808,7 +2529,6 @@ class CursorOutputFrame(ttk.Frame):
             self.cursorText.tag_bind(xjoin('section_header_', n), '<Enter>', self._on_section_enter)
             self.cursorText.tag_bind(xjoin('section_header_', n), '<Leave>', self._on_section_leave)
             self.cursorText.tag_configure(xjoin('section_hidden_', n), elide=True)
-            self.cursorText.tag_configure(xjoin('section_', n))
 
         self.cursorText.config(state='disabled')
 
@@ -825,17 +2545,11 @@ class CursorOutputFrame(ttk.Frame):
         if self.selectCmd is None:
             return
 
-        curIdx = self.cursorText.index('@{0},{1}'.format(event.x, event.y))
-        linkIdxs = list(self.cursorText.tag_ranges('link'))
-        listIdx = 0
-
-        for start, end in zip(linkIdxs[0::2], linkIdxs[1::2]):
-            if (self.cursorText.compare(curIdx, '>=', start) and
-                self.cursorText.compare(curIdx, '<', end)):
-                cursor = self.cursorList[listIdx]
+        for tag in self.cursorText.tag_names('@{0},{1}'.format(event.x, event.y)):
+            if tag.startswith('link_'):
+                cursor = self.cursorList[int(tag[5:])]
                 self.selectCmd(cursor)
                 break
-            listIdx += 1
 
     # Mark clicked attribute name and store it in foldTree.
     def _on_attr_click(self, event):
@@ -879,57 +2593,83 @@ class CursorOutputFrame(ttk.Frame):
         curSec = self.foldTree.find_section(curLine) # find clicked section in foldTree
         if curSec is None:
             return # should never happen
-
-        # find the matching section tag
-        curLev = curSec.deep
-        next_section = self.cursorText.tag_nextrange(xjoin('section_', curLev), curIdx)
-
-        if next_section: # should always be true
+        if curSec.render is not None: # shown the first time
+            self._show_section(curSec)
+        else:
             self.cursorText.config(state='normal')
-            cur_header = self.cursorText.tag_prevrange(xjoin('section_header_', curLev), next_section[0])
-            next_hidden = self.cursorText.tag_nextrange(xjoin('section_hidden_', curLev), curIdx)
-            self.cursorText.delete(join(cur_header[0], ' +1c'), join(cur_header[0], ' +2c'))
-            newShow = next_hidden and (next_hidden == next_section)
-            if newShow:
-                self.cursorText.tag_remove(xjoin('section_hidden_', curLev), next_section[0], next_section[1])
-                self.cursorText.insert(join(cur_header[0], ' +1c'), '-')
-            else:
-                self.cursorText.tag_add(xjoin('section_hidden_', curLev), next_section[0], next_section[1])
-                self.cursorText.insert(join(cur_header[0], ' +1c'), '+')
-            curSec.set_show(newShow)
+            self._set_section_show(curSec, not curSec.show)
             self.cursorText.config(state='disabled')
 
+    # Fold or unfold a section whose output is still created.
+    # cursorText must be in state normal.
+    def _set_section_show(self, sec, show):
+        signIdx, bodyStart, bodyEnd = sec.get_indexes()
+        self.cursorText.delete(signIdx, join(signIdx, ' +1c'))
+        if show:
+            self.cursorText.tag_remove(xjoin('section_hidden_', sec.deep), bodyStart, bodyEnd)
+            self.cursorText.insert(signIdx, '-')
+        else:
+            self.cursorText.tag_add(xjoin('section_hidden_', sec.deep), bodyStart, bodyEnd)
+            self.cursorText.insert(signIdx, '+')
+        sec.set_show(show)
+
+    # Create the output of a section not shown before and show it.
+    # The output is inserted after the header line, so all following sections are moved.
+    def _show_section(self, sec):
+        render = sec.render
+        sec.set_render(None)
+        sec.set_show(True)
+        signIdx, bodyStart, bodyEnd = sec.get_indexes()
+
+        def create_body():
+            self.textBuffer = TextBuffer(sec.startLine + 1)
+            render()
+            return self.textBuffer.line - (sec.startLine + 1)
+
+        self.foldTree.insert_body(sec, create_body)
+
+        self.cursorText.config(state='normal')
+        self.cursorText.delete(signIdx, join(signIdx, ' +1c'))
+        self.cursorText.insert(signIdx, '-')
+        self.textBuffer.apply(self.cursorText, bodyStart)
+        self.cursorText.config(state='disabled')
+        self.textBuffer = None
+
     # Expand all section (via context menu).
     def expand_all(self):
+        sections = self.foldTree.get_sections()
+        folded = [sec for sec in sections if (sec.render is None) and not sec.show]
         self.foldTree.set_all_show(True)
         self.cursorText.config(state='normal')
-        for n in range(CursorOutputFrame._MAX_DEEP):
-            secs = self.cursorText.tag_ranges(xjoin('section_', n))
-            for start, end in zip(secs[0::2], secs[1::2]):
-                cur_header = self.cursorText.tag_prevrange(xjoin('section_header_', n), start)
-                self.cursorText.delete(join(cur_header[0], ' +1c'), join(cur_header[0], ' +2c'))
-                self.cursorText.tag_remove(xjoin('section_hidden_', n), start, end)
-                self.cursorText.insert(join(cur_header[0], ' +1c'), '-')
+        for sec in folded:
+            self._set_section_show(sec, True)
         self.cursorText.config(state='disabled')
+        # create all output not shown yet, starting from the end, so less sections are moved
+        for sec in reversed(sections):
+            if sec.render is not None:
+                self._show_section(sec)
 
     # Collapse all sections (via context menu).
     def collapse_all(self):
+        unfolded = [sec for sec in self.foldTree.get_sections() if (sec.render is None) and sec.show]
         self.foldTree.set_all_show(False)
         self.cursorText.config(state='normal')
-        for n in range(CursorOutputFrame._MAX_DEEP):
-            secs = self.cursorText.tag_ranges(xjoin('section_', n))
-            for start, end in zip(secs[0::2], secs[1::2]):
-                cur_header = self.cursorText.tag_prevrange(xjoin('section_header_', n), start)
-                self.cursorText.delete(join(cur_header[0], ' +1c'), join(cur_header[0], ' +2c'))
-                self.cursorText.tag_add(xjoin('section_hidden_', n), start, end)
-                self.cursorText.insert(join(cur_header[0], ' +1c'), '+')
+        for sec in unfolded:
+            self._set_section_show(sec, False)
         self.cursorText.config(state='disabled')
 
     def clear(self):
+        self.foldTree.clear_lines()
         self.cursorText.config(state='normal')
         self.cursorText.delete('1.0', 'end')
         self.cursorText.config(state='disabled')
         self.cursor = None
+        self._clear_links()
+
+    # Forget all links, the text containing them must be deleted.
+    def _clear_links(self):
+        if self.cursorList:
+            self.cursorText.tag_delete(*[xjoin('link_', n) for n in range(len(self.cursorList))])
         self.cursorList = []
 
     # Output cursor with link in text widget.
@@ -937,12 +2677,12 @@ class CursorOutputFrame(ttk.Frame):
         # we got an exception if we compare a Cursor object with an other none Cursor object like None
         # Therfore Cursor == None will not work so we use a try
         if isinstance(cursor, clang.cindex.Cursor):
-            self.cursorText.insert('end', 
+            self.textBuffer.insert(
                                 toStr(cursor),
-                                'link')
+                                ('link', xjoin('link_', len(self.cursorList))))
             self.cursorList.append(cursor)
         else:
-            self.cursorText.insert('end', str(cursor))
+            self.textBuffer.insert(str(cursor))
 
     # Add a single attribute or a value of an iterable to the output.
     # This output contains a header and the value that can be fold/unfold.
@@ -982,8 +2722,9 @@ class CursorOutputFrame(ttk.Frame):
             attrData = 'Do not uses this if kind is TypeKind.INVALID!'
             attrDataTag = 'attr_err'
         elif is_instance_methode(attrData):
-            attrType = join(attrType,  ' ', get_methode_prototype(attrData))
-            if is_simple_instance_methode(attrData):
+            prototype, isSimple = CursorOutputFrame._get_methode_info(obj, attrName, attrData)
+            attrType = join(attrType,  ' ', prototype)
+            if isSimple:
                 try:
                     attrData = attrData()
                     attrType = join(attrType, ' => ', attrData.__class__.__name__)
@@ -998,11 +2739,12 @@ class CursorOutputFrame(ttk.Frame):
                     attrDataTag = 'special'
 
         # start output, first line is always shown if parent section is also shown
-        curIdx = self.cursorText.index('end -1c')
-        curLine = int(curIdx.split('.')[0])
-        foldNode.set_line(curLine)
-        self.cursorText.insert('end', prefix)
-        self.cursorText.insert('end', '[-] ', xjoin('section_header_', deep))
+        self.foldTree.add_section(foldNode, self.textBuffer.line)
+        self.textBuffer.insert(prefix)
+        if foldNode.show:
+            self.textBuffer.insert('[-] ', xjoin('section_header_', deep))
+        else:
+            self.textBuffer.insert('[+] ', xjoin('section_header_', deep))
 
         if not isIterData:
             if self.foldTree.get_marker() == foldNode:
@@ -1011,13 +2753,27 @@ class CursorOutputFrame(ttk.Frame):
                 attTags = 'attr_name'
         else:
             attTags = ()
-        self.cursorText.insert('end', attrName, attTags)
-        self.cursorText.insert('end', ' (')
-        self.cursorText.insert('end', attrType, attrTypeTag)
-        self.cursorText.insert('end', '):\n')
+        self.textBuffer.insert(attrName, attTags)
+        self.textBuffer.insert(' (')
+        self.textBuffer.insert(attrType, attrTypeTag)
+        self.textBuffer.insert('):\n')
         # first line done
 
-        startIdx = self.cursorText.index('end -1c')
+        if foldNode.show:
+            self._add_attr_body(objStack, attrName, foldNode, attrData, attrDataTag, isIterData)
+        else: # the rest is only created if this section is shown the first time, see _show_section
+            bodyStack = list(objStack)
+            foldNode.set_render(lambda: self._add_attr_body(bodyStack, attrName, foldNode,
+                                                            attrData, attrDataTag, isIterData))
+
+        return True # new section created
+
+    # Add the body of a section created by _add_attr, this is all after the header line.
+    # All parameters have the same meaning like at function _add_attr and _add_attr_data.
+    def _add_attr_body(self, objStack, attrName, foldNode, attrData, attrDataTag, isIterData):
+        obj = objStack[-1]
+        deep = len(objStack) - 1
+        prefix = '\t' * deep
 
         # special behauviour for special attributes like functions or iterables
         if attrName in ('get_template_argument_kind',
@@ -1033,9 +2789,9 @@ class CursorOutputFrame(ttk.Frame):
                     self._add_attr(objStack, xjoin('num=', n), subFoldNode, n)
                     objStack.pop()
             else:
-                self.cursorText.insert('end', '\n')
+                self.textBuffer.insert('\n')
         elif hasattr(attrData, '__iter__') and not isinstance(attrData, (str, bytes)):
-            self.cursorText.insert('end', join(prefix, CursorOutputFrame._DATA_INDENT, '[\n'))
+            self.textBuffer.insert(join(prefix, CursorOutputFrame._DATA_INDENT, '[\n'))
             cnt = 0
             for d in attrData:
                 if cnt < CursorOutputFrame._MAX_ITER_OUT:
@@ -1044,7 +2800,7 @@ class CursorOutputFrame(ttk.Frame):
                     self._add_attr(objStack, str(cnt), subFoldNode, cnt)
                     objStack.pop()
                 else:
-                    self.cursorText.insert('end',
+                    self.textBuffer.insert(
                                            join(prefix,
                                                 '   ',
                                                 CursorOutputFrame._DATA_INDENT,
@@ -1052,23 +2808,13 @@ class CursorOutputFrame(ttk.Frame):
                                            'special')
                     break
                 cnt = cnt+1
-            self.cursorText.insert('end', join(prefix, CursorOutputFrame._DATA_INDENT, ']\n'))
+            self.textBuffer.insert(join(prefix, CursorOutputFrame._DATA_INDENT, ']\n'))
         else:
             self._add_attr_data(objStack, foldNode, attrData, attrDataTag, isIterData)
 
-        #self.cursorText.insert('end', '\n') # use this if you want an extra line witch can be hidden
-        endIdx = self.cursorText.index('end -1c')
-        #self.cursorText.insert('end', '\n') # use this if you want an extra line witch can't be hidden
-
-        # add tags for the section needed to hide a section or find the position for later hidding
-        self.cursorText.tag_add(xjoin('section_', deep), startIdx, endIdx)
-        if not foldNode.show:
-            cur_header = self.cursorText.tag_prevrange(xjoin('section_header_', deep), 'end')
-            self.cursorText.delete(join(cur_header[0], ' +1c'), join(cur_header[0], ' +2c'))
-            self.cursorText.insert(join(cur_header[0], ' +1c'), '+')
-            self.cursorText.tag_add(xjoin('section_hidden_', deep), startIdx, endIdx)
-
-        return True # new section created
+        #self.textBuffer.insert('\n') # use this if you want an extra line witch can be hidden
+        foldNode.set_end_line(self.textBuffer.line)
+        #self.textBuffer.insert('\n') # use this if you want an extra line witch can't be hidden
 
     # Add a single attribute or a value of an iterable to the output.
     # This output contains only the value.
@@ -1080,9 +2826,9 @@ class CursorOutputFrame(ttk.Frame):
         prefix = '\t' * deep
 
         if isinstance(attrData, clang.cindex.Cursor):
-            self.cursorText.insert('end', join(prefix, CursorOutputFrame._DATA_INDENT))
+            self.textBuffer.insert(join(prefix, CursorOutputFrame._DATA_INDENT))
             self._add_cursor(attrData)
-            self.cursorText.insert('end', '\n')
+            self.textBuffer.insert('\n')
         elif (isinstance(attrData, clang.cindex.Type) 
               or isinstance(attrData, clang.cindex.SourceRange)
               or isinstance(attrData, clang.cindex.Token)):
@@ -1096,23 +2842,23 @@ class CursorOutputFrame(ttk.Frame):
                     self._add_obj(objStack, foldNode)
                     objStack.pop()
                 else:
-                    self.cursorText.insert('end', join(prefix, CursorOutputFrame._DATA_INDENT))
-                    self.cursorText.insert('end',
+                    self.textBuffer.insert(join(prefix, CursorOutputFrame._DATA_INDENT))
+                    self.textBuffer.insert(
                                           join('To deep to show ', toStr(attrData)),
                                           'special')
-                    self.cursorText.insert('end', '\n')
+                    self.textBuffer.insert('\n')
             else:
-                self.cursorText.insert('end', join(prefix, CursorOutputFrame._DATA_INDENT))
-                self.cursorText.insert('end',
+                self.textBuffer.insert(join(prefix, CursorOutputFrame._DATA_INDENT))
+                self.textBuffer.insert(
                                        join(toStr(attrData), ' already shown!'),
                                        'special')
-                self.cursorText.insert('end', '\n')
+                self.textBuffer.insert('\n')
         else:
             lines = toStr(attrData).split('\n')
             for line in lines:
-                self.cursorText.insert('end', join(prefix, CursorOutputFrame._DATA_INDENT))
-                self.cursorText.insert('end', line, attrDataTag)
-                self.cursorText.insert('end', '\n')
+                self.textBuffer.insert(join(prefix, CursorOutputFrame._DATA_INDENT))
+                self.textBuffer.insert(line, attrDataTag)
+                self.textBuffer.insert('\n')
 
         return
 
@@ -1122,12 +2868,8 @@ class CursorOutputFrame(ttk.Frame):
     def _add_obj(self, objStack, foldNode):
         if objStack and (len(objStack) > 0):
             obj = objStack[-1]
-            attrs = dir(obj)
             attIdx = 0
-            for attrName in attrs:
-                # ignore all starts with '_'
-                if attrName[0] == '_':
-                    continue
+            for attrName in CursorOutputFrame._get_attr_names(obj): # all not starting with '_'
                 subFoldNode = foldNode.get_child(attIdx)
                 res = self._add_attr(objStack, attrName, subFoldNode)
                 if res:
@@ -1135,91 +2877,202 @@ class CursorOutputFrame(ttk.Frame):
 
     # Set cursor for output.
     def set_cursor(self, c):
-        self.foldTree.clear_lines()
-
         if not isinstance(c, clang.cindex.Cursor):
             self.clear()
             return
         if isinstance(self.cursor, clang.cindex.Cursor):
             if self.cursor == c:
                 return
-        self.cursorList = []
+        startTime = time.time()
+        self.foldTree.clear_lines()
         self.cursor = c
         self.cursorText.config(state='normal')
         self.cursorText.delete('1.0', 'end')
+        self._clear_links()
+        self.textBuffer = TextBuffer()
         self._add_obj([c], self.foldTree.get_root())
-
+        self.textBuffer.apply(self.cursorText)
+        self.textBuffer = None
         self.cursorText.config(state='disabled')
         self.goto_marker()
+        metrics.add_time('cursor render', time.time() - startTime)
 
 
 # Widget to show a position (Range and Location) in a source file.
+# To switch fast between files, one Text widget per file is kept for the last recently shown files.
+# The content of all files is read via a FileContentCache shared by all FileOutputFrames.
 class FileOutputFrame(ttk.Frame):
     def __init__(self, master=None):
         ttk.Frame.__init__(self, master)
         self.grid(sticky='nswe')
+        self.texts = collections.OrderedDict() # file name -> (Text, FileContent), least recently used first
         self._create_widgets()
         self.fileName = None
 
+    _MAX_TEXTS = 4                          # max number of Text widgets (files) to keep
+    _contentCache = FileContentCache()      # shared by all instances
+
     def _create_widgets(self):
         self.rowconfigure(0, weight=1)
         self.columnconfigure(0, weight=1)
 
-        self.fileText = tk.Text(self, wrap='none')
-        self.fileText.grid(row=0, sticky='nswe')
-        self.fileText.tag_configure('range', background='gray')
-        self.fileText.tag_configure('location', background='yellow')
+        self.fileText = self._create_text()
+        self.vsb, self.hsb = make_scrollable(self, self.fileText)
 
-        make_scrollable(self, self.fileText)
+    def _create_text(self):
+        fileText = tk.Text(self, wrap='none')
+        fileText.grid(row=0, column=0, sticky='nswe')
+        fileText.tag_configure('range', background='gray')
+        fileText.tag_configure('location', background='yellow')
+        fileText.config(state='disabled')
+        return fileText
 
-        self.fileText.config(state='disabled')
+    # Show fileText instead of the current Text widget.
+    def _switch_text(self, fileText):
+        if fileText is self.fileText:
+            return
+        self.fileText.configure(xscrollcommand='', yscrollcommand='')
+        self.fileText.grid_remove()
+        fileText.grid()
+        fileText.configure(xscrollcommand=self.hsb.set, yscrollcommand=self.vsb.set)
+        self.vsb.configure(command=fileText.yview)
+        self.hsb.configure(command=fileText.xview)
+        self.fileText = fileText
+
+    # Show content of fileName, reuse a Text widget still containing it if possible.
+    # Return its FileContent.
+    def _show_file(self, fileName):
+        content = FileOutputFrame._contentCache.get(fileName)
+        data = self.texts.pop(fileName, None)
+        if data is None:            # use an unused, a new or the least recently used Text widget
+            if not any((fileText is self.fileText) for fileText, oldContent in self.texts.values()):
+                fileText = self.fileText        # current one is empty
+            elif len(self.texts) < FileOutputFrame._MAX_TEXTS:
+                fileText = self._create_text()
+            else:
+                oldName, (fileText, oldContent) = self.texts.popitem(last=False)
+            data = (fileText, None)
+        fileText, oldContent = data
+        if oldContent is not content: # new file or file content has changed
+            fileText.config(state='normal')
+            fileText.delete('1.0', 'end')
+            fileText.insert('end', content.text)
+            fileText.config(state='disabled')
+        self.texts[fileName] = (fileText, content)
+        self._switch_text(fileText)
+        return content
 
     def clear(self):
         self.fileText.config(state='normal')
         self.fileText.delete('1.0', 'end')
         self.fileText.config(state='disabled')
+        for fileName, (fileText, content) in list(self.texts.items()):
+            if fileText is self.fileText:
+                del self.texts[fileName]
         self.fileName = None
 
+    # Show srcRange (SourceRange) and srcLocation (SourceLocation), both may be None.
     def set_location(self, srcRange, srcLocation):
-        self.fileText.config(state='normal')
-        self.fileText.tag_remove('range', '1.0', 'end')
-        self.fileText.tag_remove('location', '1.0', 'end')
-
-        newFileName = None
+        fileName = None
+        rangeStart = None
+        rangeEnd = None
+        location = None
         if isinstance(srcRange, clang.cindex.SourceRange) and srcRange.start.file:
-            newFileName = srcRange.start.file.name
-        elif (isinstance(srcLocation, clang.cindex.SourceLocation) and
-              srcLocation.file):
-            newFileName = srcLocation.file.name
+            fileName = srcRange.start.file.name
+            rangeStart = (srcRange.start.line, srcRange.start.column)
+            rangeEnd = (srcRange.end.line, srcRange.end.column)
+        if isinstance(srcLocation, clang.cindex.SourceLocation) and srcLocation.file:
+            if fileName is None:
+                fileName = srcLocation.file.name
+            location = (srcLocation.line, srcLocation.column)
+        self.set_position(fileName, rangeStart, rangeEnd, location)
+
+    # Show a range from rangeStart to rangeEnd and a location in file fileName.
+    # All positions are tuples (line, column) like used by libclang or None.
+    def set_position(self, fileName, rangeStart, rangeEnd, location):
+        if fileName:
+            content = self._show_file(fileName)
         else:
-            self.fileText.delete('1.0', 'end')
+            self.clear()
 
-        if newFileName and (self.fileName != newFileName):
-            self.fileText.delete('1.0', 'end')
-            data = []
-            with open(newFileName, 'r') as f:
-                data = f.read()
-            self.fileText.insert('end', data)
+        self.fileName = fileName
 
-        self.fileName = newFileName
+        self.fileText.config(state='normal')
+        self.fileText.tag_remove('range', '1.0', 'end')
+        self.fileText.tag_remove('location', '1.0', 'end')
 
-        if isinstance(srcRange, clang.cindex.SourceRange):
-            srcFrom =  '{0}.{1}'.format(srcRange.start.line, srcRange.start.column-1)
-            srcTo =  '{0}.{1}'.format(srcRange.end.line, srcRange.end.column-1)
+        if rangeStart is not None:
+            srcFrom = content.get_index(*rangeStart)
+            srcTo = content.get_index(*rangeEnd)
             self.fileText.tag_add('range', srcFrom, srcTo)
             self.fileText.see(srcTo)    # first scroll to the end
             self.fileText.see(srcFrom)  # then to the start, so usually all is shown
 
-        if isinstance(srcLocation, clang.cindex.SourceLocation):
-            if srcLocation.file:
-                locFrom =  '{0}.{1}'.format(srcLocation.line, srcLocation.column-1)
-                locTo =  '{0}.{1}'.format(srcLocation.line, srcLocation.column)
-                self.fileText.tag_add('location', locFrom, locTo)
-                self.fileText.see(locFrom)
+        if location is not None:
+            locFrom = content.get_index(*location)
+            locTo = content.get_index(location[0], location[1]+1)
+            self.fileText.tag_add('location', locFrom, locTo)
+            self.fileText.see(locFrom)
 
         self.fileText.config(state='disabled')
 
 
+# All tokens of a file of a translation unit.
+# The file is tokenized once, all token data are stored in array columns, so no Token objects are kept.
+# Tokens of a cursor are found by its extent offsets.
+class TokenTable:
+    def __init__(self, tu, fileName):
+        self.fileName = fileName
+        self.kinds = array.array('l')       # TokenKind values
+        self.startOffsets = array.array('l')
+        self.endOffsets = array.array('l')
+        self.startLines = array.array('l')
+        self.startColumns = array.array('l')
+        self.endLines = array.array('l')
+        self.endColumns = array.array('l')
+
+        # The end is taken from the file buffer of the TU, not from the file on disk
+        # which may be changed or removed since parsing. A line behind the last one
+        # is mapped by libclang to the end of the buffer.
+        srcFile = clang.cindex.File.from_name(tu, fileName)
+        extent = clang.cindex.SourceRange.from_locations(
+            clang.cindex.SourceLocation.from_offset(tu, srcFile, 0),
+            clang.cindex.SourceLocation.from_position(tu, srcFile, TokenTable._END_LINE, 1))
+        for token in tu.get_tokens(extent=extent):
+            tokenExtent = token.extent
+            start = tokenExtent.start
+            end = tokenExtent.end
+            self.kinds.append(token.kind.value)
+            self.startOffsets.append(start.offset)
+            self.endOffsets.append(end.offset)
+            self.startLines.append(start.line)
+            self.startColumns.append(start.column)
+            self.endLines.append(end.line)
+            self.endColumns.append(end.column)
+
+    _END_LINE = 0x7fffffff # line behind the end of any file
+
+    def __len__(self):
+        return len(self.kinds)
+
+    # Return tuple (first index, end index) of all tokens from startOffset to endOffset.
+    # Like clang_tokenize a token is included if the token before ends before endOffset.
+    def find_range(self, startOffset, endOffset):
+        first = bisect.bisect_left(self.startOffsets, startOffset)
+        if first >= len(self.kinds):
+            return (first, first)
+        end = bisect.bisect_left(self.endOffsets, endOffset, first) + 1
+        return (first, min(end, len(self.kinds)))
+
+    def get_kind(self, idx):
+        return clang.cindex.TokenKind.from_value(self.kinds[idx])
+
+    # Return tuple ((start line, start column), (end line, end column)) of token idx.
+    def get_range(self, idx):
+        return ((self.startLines[idx], self.startColumns[idx]),
+                (self.endLines[idx], self.endColumns[idx]))
+
+
 # Widget to show the position of cursor or its token in source file
 # This consists on a small toolbar to select kind of output (cursor or token)
 # and the FileOutputFrame
@@ -1230,8 +3083,12 @@ class CursorFileOutputFrame(ttk.Frame):
         self.outState = tk.IntVar(value=0)
         self._create_widgets()
         self.cursor = None
-        self.tokens = []
-        self.tokenIdx = 0
+        self.translationunit = None
+        self.tokenTables = {}           # file name -> TokenTable of current translation unit
+        self.tokenTable = None          # TokenTable containing tokens of current cursor ...
+        self.tokenFirst = 0             # ... starting at this index
+        self.tokenCnt = 0
+        self.tokenIdx = 0               # current token, 0 = tokenFirst
 
     def _create_widgets(self):
         self.rowconfigure(1, weight=1)
@@ -1265,9 +3122,17 @@ class CursorFileOutputFrame(ttk.Frame):
 
     def clear(self):
         self.fileOutputFrame.clear()
+        self._clear_tokens()
+        self.translationunit = None
+        self.tokenTables = {}
+
+    # Reset all but the FileOutputFrame.
+    def _clear_tokens(self):
         self.outState.set(0)
         self.cursor = None
-        self.tokens = []
+        self.tokenTable = None
+        self.tokenFirst = 0
+        self.tokenCnt = 0
         self.tokenIdx = 0
         self.tokensLabel.config(text='-/-')
         self.tokenKind.config(text='')
@@ -1278,20 +3143,42 @@ class CursorFileOutputFrame(ttk.Frame):
         self.tokensNextBtn.config(state='disabled')
 
     def set_cursor(self, cursor):
-        self.clear()
         if isinstance(cursor, clang.cindex.Cursor):
+            self._clear_tokens() # keep file output, it is updated by show_cursor
             self.cursor = cursor
-            for token in cursor.get_tokens():
-                self.tokens.append(token)
-            self.tokenIdx = 0
+            startTime = time.time()
+            self._find_tokens()
+            metrics.add_time('token load', time.time() - startTime)
             self.show_cursor()
             self.cursorBtn.config(state='normal')
-            if len(self.tokens) > 0:
+            if self.tokenCnt > 0:
                 self._show_label()
                 self.tokensBtn.config(state='normal')
                 self.tokensPrevBtn.config(state='normal')
                 self.tokensLabel.config(state='normal')
                 self.tokensNextBtn.config(state='normal')
+        else:
+            self.clear()
+
+    # Find tokens of current cursor in TokenTable of its file, the table is created on first use.
+    def _find_tokens(self):
+        extent = self.cursor.extent
+        start = extent.start
+        if not start.file:
+            return
+        tu = self.cursor.translation_unit
+        if tu is not self.translationunit:
+            self.translationunit = tu
+            self.tokenTables = {}
+        fileName = start.file.name
+        tokenTable = self.tokenTables.get(fileName)
+        if tokenTable is None:
+            tokenTable = TokenTable(tu, fileName)
+            self.tokenTables[fileName] = tokenTable
+        first, end = tokenTable.find_range(start.offset, extent.end.offset)
+        self.tokenTable = tokenTable
+        self.tokenFirst = first
+        self.tokenCnt = end - first
 
     # New kind of output (Cursor pos/Token pos) selected.
     def change_out(self):
@@ -1303,12 +3190,12 @@ class CursorFileOutputFrame(ttk.Frame):
     def show_prev_token(self):
         self.tokenIdx-=1
         if self.tokenIdx < 0:
-            self.tokenIdx = len(self.tokens)-1
+            self.tokenIdx = self.tokenCnt-1
         self.show_token()
 
     def show_next_token(self):
         self.tokenIdx+=1
-        if self.tokenIdx >= len(self.tokens):
+        if self.tokenIdx >= self.tokenCnt:
             self.tokenIdx = 0
         self.show_token()
 
@@ -1317,14 +3204,14 @@ class CursorFileOutputFrame(ttk.Frame):
         self.fileOutputFrame.set_location(self.cursor.extent, self.cursor.location)
 
     def _show_label(self):
-        self.tokensLabel.config(text='{0}/{1}'.format(self.tokenIdx+1, len(self.tokens)))
-        self.tokenKind.config(text=str(self.tokens[self.tokenIdx].kind))
+        self.tokensLabel.config(text='{0}/{1}'.format(self.tokenIdx+1, self.tokenCnt))
+        self.tokenKind.config(text=str(self.tokenTable.get_kind(self.tokenFirst+self.tokenIdx)))
 
     def show_token(self):
         self.outState.set(1)
         self._show_label()
-        token = self.tokens[self.tokenIdx]
-        self.fileOutputFrame.set_location(token.extent, token.location)
+        start, end = self.tokenTable.get_range(self.tokenFirst+self.tokenIdx)
+        self.fileOutputFrame.set_position(self.tokenTable.fileName, start, end, start)
 
 
 # Separate modal dialog window for search.
@@ -1337,10 +3224,7 @@ class SearchDialog(tk.Toplevel):
         self.transient(master)
 
         self.result = False             # True if [OK] pressed
-        self.kindOptions = []
-        for kind in clang.cindex.CursorKind.get_all_kinds():
-            self.kindOptions.append(kind.name)
-        self.kindOptions.sort()
+        self.kindOptions = get_cursor_kind_names()
         self.kindState = tk.IntVar(value=0)
         self.kindValue = tk.StringVar(value=self.kindOptions[0])
         self.searchtext = tk.StringVar(value='')
@@ -1425,15 +3309,99 @@ class SearchDialog(tk.Toplevel):
         self.destroy()
 
 
+# Separate modal dialog window to select a file of a compilation database.
+# Only files containing all words entered as filter are listed, case is ignored.
+class CompileCommandDialog(tk.Toplevel):
+    def __init__(self, master=None, fileNames=()):
+        tk.Toplevel.__init__(self, master)
+        self.transient(master)
+
+        self.result = None              # index in fileNames of selected file if [OK] pressed
+        self.fileNames = fileNames
+        self.lowerFileNames = [fileName.lower() for fileName in fileNames]
+        self.shownIdxs = []             # index in fileNames of each listed file
+        self.filterValue = tk.StringVar(value='')
+        self.countValue = tk.StringVar(value='')
+
+        self.title('Select file')
+        self._create_widgets()
+        self._update_list()
+        self.filterValue.trace('w', self._on_filter)
+
+        self.grab_set()
+
+        self.bind('<Return>', self._on_ok)
+        self.bind('<Escape>', self._on_cancel)
+
+        self.protocol('WM_DELETE_WINDOW', self._on_cancel)
+
+        self.wait_window(self)
+
+    def _create_widgets(self):
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(1, weight=1)
+
+        frame = ttk.Frame(self)
+        frame.grid(row=0, column=0, columnspan=2, sticky='we')
+        frame.columnconfigure(1, weight=1)
+        label = ttk.Label(frame, text='Filter:')
+        label.grid(row=0, column=0)
+        filterEntry = ttk.Entry(frame, textvariable=self.filterValue)
+        filterEntry.grid(row=0, column=1, sticky='we')
+        filterEntry.focus_set()
+
+        self.fileList = tk.Listbox(self, width=100, height=20, activestyle='none')
+        self.fileList.grid(row=1, column=0, sticky='nswe')
+        self.fileList.bind('<Double-1>', self._on_ok)
+        make_scrollable(self, self.fileList, widgetRow=1, widgetColumn=0)
+
+        frame = ttk.Frame(self)
+        frame.grid(row=3, column=0, columnspan=2, sticky='we')
+        frame.columnconfigure(0, weight=1)
+
+        label = ttk.Label(frame, textvariable=self.countValue)
+        label.grid(row=0, column=0, sticky='w')
+
+        btn = tk.Button(frame, text='OK', width=8, command=self._on_ok)
+        btn.grid(row=0, column=1, sticky='e')
+
+        btn = tk.Button(frame, text='Cancel', width=8, command=self._on_cancel)
+        btn.grid(row=0, column=2, sticky='e')
+
+    def _on_filter(self, *args):
+        self._update_list()
+
+    def _update_list(self):
+        words = self.filterValue.get().lower().split()
+        self.shownIdxs = [idx for idx, fileName in enumerate(self.lowerFileNames)
+                          if all(word in fileName for word in words)]
+        self.fileList.delete(0, 'end')
+        if self.shownIdxs:
+            self.fileList.insert('end', *[self.fileNames[idx] for idx in self.shownIdxs])
+            self.fileList.selection_set(0)
+        self.countValue.set('{0} of {1} files'.format(len(self.shownIdxs), len(self.fileNames)))
+
+    def _on_ok(self, event=None):
+        selection = self.fileList.curselection()
+        if selection:
+            self.result = self.shownIdxs[int(selection[0])]
+            self.destroy()
+
+    def _on_cancel(self, event=None):
+        self.destroy()
+
+
 # Output frame shows the AST on the left (TreeView, ASTOutputFrame) and the selected Cursor on the right
 # The right shows all member and the location of the cursor in source file.
 # ASTOutputFrame on the left is the master for current selected cursor.
 class OutputFrame(ttk.Frame):
-    def __init__(self, master=None):
+    def __init__(self, master=None, lazy=True):
         ttk.Frame.__init__(self, master)
         self.grid(sticky='nswe')
         self.markerSetState = tk.IntVar(value=0) # after click [M#] Button 0: jump to marked cursor
                                                  #                         1: mark current cursor
+        self.lazy = lazy                         # lazy mode for ASTOutputFrame
+        self.parseInfoValue = tk.StringVar(value='')    # parse mode and time of shown AST
         self._create_widgets()
 
         self.curIID = ''        # IID of current marked cursor in TreeView on the left
@@ -1509,13 +3477,19 @@ class OutputFrame(ttk.Frame):
                              command=lambda n=n : self._on_marker_x(n))
             btn.grid(row=0, column=14+n)
             self.markerBtns.append(btn)
+
+        sep = ttk.Separator(toolbar, orient='vertical')
+        sep.grid(row=0, column=14+OutputFrame._MARKER_BTN_CNT, sticky='ns', padx=5, pady=5)
+
+        label = ttk.Label(toolbar, textvariable=self.parseInfoValue)
+        label.grid(row=0, column=15+OutputFrame._MARKER_BTN_CNT)
         # Toolbar end
 
         # ttk version of PanedWindow do not support all options
         pw1 = tk.PanedWindow(self, orient='horizontal')
         pw1.grid(row=1, column=0, sticky='nswe')
 
-        self.astOutputFrame = ASTOutputFrame(pw1, selectCmd=self._on_cursor_selection)
+        self.astOutputFrame = ASTOutputFrame(pw1, selectCmd=self._on_cursor_selection, lazy=self.lazy)
         pw1.add(self.astOutputFrame, stretch='always')
 
         pw2 = tk.PanedWindow(pw1, orient='vertical')
@@ -1718,24 +3692,122 @@ class OutputFrame(ttk.Frame):
         self.astOutputFrame.clear()
         self.cursorOutputFrame.clear()
         self.fileOutputFrame.clear()
+        self.parseInfoValue.set('')
 
-    def set_translationunit(self, tu):
+    def set_translationunit(self, tu, cursorTree=None):
         self.clear()
-        self.astOutputFrame.set_translationunit(tu)
+        self.astOutputFrame.set_translationunit(tu, cursorTree)
         self.searchBtn.config(state='normal')
 
+    # Show how the current translation unit was parsed, e.g. mode and time.
+    def set_parse_info(self, text):
+        self.parseInfoValue.set(text)
+
+
+# Widget to show the recorded Metrics of the current translation unit.
+# The table is updated each time the tab is shown or by [Refresh].
+# updateCmd is called before metrics are shown or saved to set values not recorded while running.
+class StatisticsFrame(ttk.Frame):
+    def __init__(self, master=None, updateCmd=None):
+        ttk.Frame.__init__(self, master)
+        self.grid(sticky='nswe')
+        self.updateCmd = updateCmd
+        self._create_widgets()
+
+    _FILETYPES = (
+        ('JSON files', '.json', 'TEXT'),
+        ('All files', '*'),
+        )
+
+    def _create_widgets(self):
+        self.rowconfigure(1, weight=1)
+        self.columnconfigure(0, weight=1)
+
+        charSize = tkFont.nametofont('TkHeadingFont').measure('#')
+
+        buttonFrame = ttk.Frame(self)
+        buttonFrame.grid(row=0, column=0, columnspan=2, sticky='we')
+        button = ttk.Button(buttonFrame, text='Refresh', command=self.refresh)
+        button.grid(row=0, column=0)
+        button = ttk.Button(buttonFrame, text='Save', command=self._on_save)
+        button.grid(row=0, column=1)
+
+        self.statTable = ttk.Treeview(self, columns=('value', 'runs', 'total', 'max'))
+        self.statTable.grid(row=1, column=0, sticky='nswe')
+        make_scrollable(self, self.statTable, 1)
+
+        self.statTable.heading('#0', text='Name')
+        self.statTable.column('#0', width=25*charSize, stretch=False)
+        self.statTable.heading('value', text='Value')
+        self.statTable.column('value', width=40*charSize, stretch=False)
+        self.statTable.heading('runs', text='Runs')
+        self.statTable.column('runs', width=8*charSize, anchor='e', stretch=False)
+        self.statTable.heading('total', text='Total [s]')
+        self.statTable.column('total', width=12*charSize, anchor='e', stretch=False)
+        self.statTable.heading('max', text='Max [s]')
+        self.statTable.column('max', width=12*charSize, anchor='e', stretch=False)
+
+    def _on_save(self):
+        fn = tkFileDialog.asksaveasfilename(defaultextension='.json',
+                                            filetypes=StatisticsFrame._FILETYPES)
+        if fn:
+            if self.updateCmd is not None:
+                self.updateCmd()
+            metrics.save(fn)
+
+    # Show current metrics.
+    def refresh(self):
+        if self.updateCmd is not None:
+            self.updateCmd()
+        for i in self.statTable.get_children():
+            self.statTable.delete(i)
+        data = metrics.to_dict()
+        parent = self.statTable.insert('', 'end', text='Info', open=True)
+        for name, text in data['info'].items():
+            self.statTable.insert(parent, 'end', text=name, values=(text, '', '', ''))
+        parent = self.statTable.insert('', 'end', text='Phases', open=True)
+        for phase, phaseData in data['phases'].items():
+            self.statTable.insert(parent, 'end', text=phase, values=(
+                '', phaseData['runs'],
+                '{0:.3f}'.format(phaseData['total']), '{0:.3f}'.format(phaseData['max'])))
+        parent = self.statTable.insert('', 'end', text='Counts', open=True)
+        for name, value in data['counts'].items():
+            self.statTable.insert(parent, 'end', text=name, values=(value, '', '', ''))
+
 
 # Main window combine all frames in tabs an contains glue logic between these frames
 class Application(ttk.Frame):
-    def __init__(self, master=None, file=None):
+    def __init__(self, master=None, file=None, lazy=True, tuCache=None, pathFilter=None,
+                 startupProfile=False, compileCommands=None, buildDir=None):
         ttk.Frame.__init__(self, master)
         self._set_style()
         self.grid(sticky='nswe')
+        self.lazy = lazy
+        self.tuCache = tuCache          # TranslationUnitCache or None
+        if compileCommands is None:
+            compileCommands = CompileCommandsCache()
+        self.compileCommands = compileCommands # CompileCommandsCache used by InputFrame
+        self.parseTree = None           # CursorTree and result queue of running parse
+        self.parseQueue = None
+        self.parseMetrics = None        # Metrics recorded by running parse
+        self.parseWorker = None         # thread of last parse, may still store its translation unit
+        self.parseKey = None            # (file name, args, parse mode) of running parse if it may be reparsed later
+        self.lastTU = None              # last translation unit and its parseKey, used to reparse
+        self.lastParseKey = None
+        self.parseReused = False        # running parse reuses lastTU
+        self.parseMode = DEFAULT_PARSE_MODE # name of PARSE_MODES used by running parse
+        self.coldParseTime = 0.0        # time of last parse without reparse
+        self.startupProfile = startupProfile # print startup times to stderr
+        self.index = None               # set by _load_lib
+        self.libLoader = None           # thread running _load_lib
+        self.libError = None            # exception raised while loading libclang
+        self.libVersion = None
         self._create_widgets()
 
-        self.index = clang.cindex.Index.create()
-
-        if file:
+        if buildDir:
+            # file is the source file in compile commands, loaded after libclang
+            self.after_idle(self.inputFrame.load_build_dir, buildDir, file)
+        elif file:
             self.inputFrame.load_filename(file)
         else:
             self.inputFrame.set_filename('select file to parse =>')
@@ -1743,7 +3815,19 @@ class Application(ttk.Frame):
                                       '-std=c++14',
                                       '-I/your/include/path',
                                       '-I/more/include/path'])
+        if pathFilter is not None:
+            self.inputFrame.set_path_filter(pathFilter)
+
+        if startupProfile:
+            print_startup_time('window created')
+        # Loading libclang takes some time, so it is done in background after the window is shown.
+        self.after_idle(self._on_first_frame)
 
+    _POLL_MS = 100  # interval to check for result of parse thread
+
+    # options used for parsing if the translation unit will be reparsed later
+    _REPARSE_OPTIONS = (clang.cindex.TranslationUnit.PARSE_PRECOMPILED_PREAMBLE |
+                        clang.cindex.TranslationUnit.PARSE_CACHE_COMPLETION_RESULTS)
 
     def _create_widgets(self):
         top=self.winfo_toplevel()
@@ -1755,35 +3839,252 @@ class Application(ttk.Frame):
 
         self.notebook = ttk.Notebook(self)
 
-        self.inputFrame = InputFrame(self.notebook, parseCmd=self._on_parse)
+        self.inputFrame = InputFrame(self.notebook, parseCmd=self._on_parse,
+                                     cancelCmd=self._on_cancel_parse,
+                                     compileCommandsCmd=self._load_compile_commands)
 
         self.errorFrame = ErrorFrame(self.notebook)
-        self.outputFrame = OutputFrame(self.notebook)
+        self.outputFrame = OutputFrame(self.notebook, lazy=self.lazy)
+        self.statisticsFrame = StatisticsFrame(self.notebook, updateCmd=self.update_counts)
 
         self.notebook.add(self.inputFrame, text='Input')
         self.notebook.add(self.errorFrame, text='Errors')
         self.notebook.add(self.outputFrame, text='Output')
+        self.notebook.add(self.statisticsFrame, text='Statistics')
+        self.notebook.bind('<<NotebookTabChanged>>', self._on_tab_changed)
         self.notebook.grid(row=0, column=0, sticky='nswe')
 
         quitButton = ttk.Button(self, text='Quit',
             command=self.quit)
         quitButton.grid(row=1, column=0, sticky='we')
 
+    def _on_first_frame(self):
+        if self.startupProfile:
+            print_startup_time('first frame')
+        self._start_lib_loader()
+
+    # Start loading libclang in background if not done yet, see _load_lib.
+    def _start_lib_loader(self):
+        if self.libLoader is None:
+            self.libLoader = threading.Thread(target=self._load_lib)
+            self.libLoader.daemon = True
+            self.libLoader.start()
+
+    # Runs in background thread, so never touch any widget here.
+    # Any error is stored in libError and raised again by _parse_worker.
+    def _load_lib(self):
+        startTime = time.time()
+        try:
+            self.index = clang.cindex.Index.create()
+            self.libVersion = get_libclang_version()
+        except BaseException as e:
+            self.libError = e
+        if self.startupProfile:
+            print_startup_time('libclang loaded',
+                               ' (load {0:.1f} ms)'.format((time.time() - startTime) * 1000.0))
+
+    # Load compile commands of buildDir in background, see CompileCommandsCache.load.
+    # callback(commands, error) is called when done, error is None or the raised exception.
+    def _load_compile_commands(self, buildDir, callback):
+        self._start_lib_loader()
+        resultQueue = queue.Queue()
+        worker = threading.Thread(target=self._compile_commands_worker, args=(buildDir, resultQueue))
+        worker.daemon = True
+        worker.start()
+        self.after(Application._POLL_MS, self._poll_compile_commands, resultQueue, callback)
+
+    # Runs in background thread, so never touch any widget here.
+    # The database may be read by libclang, so wait until it is loaded by _load_lib.
+    # The result is put in resultQueue as tuple (commands, error).
+    def _compile_commands_worker(self, buildDir, resultQueue):
+        try:
+            self.libLoader.join()
+            if self.libError is not None:
+                raise self.libError
+            resultQueue.put((self.compileCommands.load(buildDir), None))
+        except BaseException as e:
+            resultQueue.put((None, e))
+
+    # Check for result of background thread started by _load_compile_commands.
+    def _poll_compile_commands(self, resultQueue, callback):
+        try:
+            commands, error = resultQueue.get_nowait()
+        except queue.Empty:
+            self.after(Application._POLL_MS, self._poll_compile_commands, resultQueue, callback)
+            return
+        callback(commands, error)
+
+    # Set the counts of the shown CursorTree and Treeview in metrics, some of them change after
+    # the walk (e.g. by selecting cursors) but are not recorded each time to keep this fast.
+    def update_counts(self):
+        astOutputFrame = self.outputFrame.astOutputFrame
+        if astOutputFrame.cursorTree is not None:
+            astOutputFrame.cursorTree.set_counts(metrics)
+            metrics.set_count('inserted cursors', astOutputFrame.cntInserted)
+
+    def _on_tab_changed(self, event):
+        if self.notebook.select() == str(self.statisticsFrame):
+            self.statisticsFrame.refresh()
+
     def _set_style(self):
         s = ttk.Style()
         # center text in toolbuttons
         s.configure('Toolbutton', anchor='center', padding=s.lookup('TButton', 'padding'))
 
     # [parse] button is clicked
+    # Parsing and walking the AST is done in a background thread, see _parse_worker.
     def _on_parse(self):
+        self._stop_parse()
         self.errorFrame.clear()
         self.outputFrame.clear()
         fileName = self.inputFrame.get_filename()
         args = self.inputFrame.get_args()
-        tu = self.index.parse(fileName, args=args)
+        self.parseMode = self.inputFrame.get_parse_mode()
+        options = get_parse_options(self.parseMode)
+        metrics.clear()
+        metrics.set_info('file', fileName)
+        metrics.set_info('parse mode', self.parseMode)
+        self._start_lib_loader()
+
+        # A translation unit must never be reparsed twice at the same time,
+        # so forget the last one until this parse is done.
+        reuseTU = None
+        if self.inputFrame.get_reparse():
+            self.parseKey = (fileName, tuple(args), self.parseMode)
+            if self.parseKey == self.lastParseKey:
+                reuseTU = self.lastTU
+        else:
+            self.parseKey = None
+        self.parseReused = reuseTU is not None
+        self.lastTU = None
+        self.lastParseKey = None
+
+        self.parseTree = CursorTree(self.inputFrame.get_path_filter())
+        self.parseMetrics = Metrics()
+        self.parseQueue = queue.Queue()
+        worker = threading.Thread(target=self._parse_worker,
+                                  args=(fileName, args, options, reuseTU, self.parseKey is not None,
+                                        self.parseTree, self.parseMetrics, self.parseQueue,
+                                        self.parseWorker))
+        worker.daemon = True
+        worker.start()
+        self.parseWorker = worker
+
+        self.inputFrame.set_parse_running(True)
+        self.inputFrame.set_progress('Parsing...')
+        self.after(Application._POLL_MS, self._poll_parse, self.parseQueue)
+
+    # [Cancel] button is clicked
+    def _on_cancel_parse(self):
+        if self.parseQueue is not None:
+            self._stop_parse()
+            self.inputFrame.set_progress('Canceled')
+
+    # Forget about a running parse, its result will be dropped.
+    # Index.parse can't be interrupted but the walk through the AST stops as soon as possible.
+    def _stop_parse(self):
+        if self.parseTree is not None:
+            self.parseTree.cancel()
+        self.parseTree = None
+        self.parseQueue = None
+        self.parseMetrics = None
+        self.inputFrame.set_parse_running(False)
+
+    # Runs in background thread, so never touch any widget here.
+    # Waits until libclang is loaded by _load_lib.
+    # If reuseTU is given it is reparsed else the translation unit is loaded from tuCache
+    # or a new one is parsed with options, extended for fast reparsing if reparse is true.
+    # Time of all phases is recorded in parseMetrics.
+    # The result is put in parseQueue as tuple (tu, diagnostics, parse time, from cache, error).
+    # A new translation unit is stored in tuCache after that, so the user needn't wait for it.
+    # prevWorker is the thread of the last parse, it may still store reuseTU.
+    def _parse_worker(self, fileName, args, options, reuseTU, reparse, cursorTree, parseMetrics,
+                      parseQueue, prevWorker):
+        try:
+            self.libLoader.join()
+            if self.libError is not None:
+                raise self.libError
+            parseMetrics.set_info('libclang', self.libVersion)
+            startTime = time.time()
+            cached = None
+            if reuseTU is not None:
+                if prevWorker is not None:
+                    prevWorker.join()
+                tu = reuseTU
+                tu.reparse()
+            else:
+                if self.tuCache is not None:
+                    cached = self.tuCache.load(self.index, fileName, args, options)
+                if cached is not None:
+                    tu, diagnostics = cached
+                elif reparse:
+                    tu = self.index.parse(fileName, args=args,
+                                          options=options | Application._REPARSE_OPTIONS)
+                else:
+                    tu = self.index.parse(fileName, args=args, options=options)
+            parseTime = time.time() - startTime
+            parseMetrics.add_time('parse', parseTime)
+            if cached is None:
+                startTime = time.time()
+                diagnostics = list(tu.diagnostics)
+                parseMetrics.add_time('diagnostics', time.time() - startTime)
+            startTime = time.time()
+            cursorTree.walk(tu)
+            parseMetrics.add_time('walk', time.time() - startTime)
+            parseQueue.put((tu, diagnostics, parseTime, cached is not None, None))
+        except BaseException as e:
+            parseQueue.put((None, None, None, False, e))
+            return
+        if (cached is None) and (self.tuCache is not None):
+            self.tuCache.store(tu, fileName, args, options)
+
+    # Check for result of background thread started by _on_parse.
+    def _poll_parse(self, parseQueue):
+        if parseQueue is not self.parseQueue:
+            return # canceled or an other parse was started
+
+        try:
+            tu, diagnostics, parseTime, fromCache, error = parseQueue.get_nowait()
+        except queue.Empty:
+            cntCursors = self.parseTree.cntCursors
+            if cntCursors > 0:
+                self.inputFrame.set_progress('Walking AST... {0} cursors'.format(cntCursors))
+            self.after(Application._POLL_MS, self._poll_parse, parseQueue)
+            return
+
+        cursorTree = self.parseTree
+        parseMetrics = self.parseMetrics
+        parseKey = self.parseKey
+        parseReused = self.parseReused
+        self._stop_parse()
+        if error is not None:
+            self.inputFrame.set_progress('')
+            tkMessageBox.showerror('Parse', xjoin(error.__class__.__name__, ': ', error))
+            return
+
+        if fromCache:
+            # translation units read from AST file can't be reparsed
+            timeInfo = 'loaded from cache in {0:.2f} s'.format(parseTime)
+        elif parseKey is not None:
+            if parseReused:
+                timeInfo = 'reparsed in {0:.2f} s, cold parse {1:.2f} s, saved {2:.2f} s'.format(
+                    parseTime, self.coldParseTime, self.coldParseTime - parseTime)
+            else:
+                self.coldParseTime = parseTime
+                timeInfo = 'parsed in {0:.2f} s'.format(parseTime)
+            self.lastTU = tu
+            self.lastParseKey = parseKey
+        else:
+            timeInfo = 'parsed in {0:.2f} s'.format(parseTime)
 
-        cntErr = self.errorFrame.set_errors(tu.diagnostics)
-        self.outputFrame.set_translationunit(tu)
+        self.inputFrame.set_progress('Done, {0}, {1} cursors'.format(timeInfo, cursorTree.cntCursors))
+        metrics.update(parseMetrics)
+        cursorTree.set_counts(metrics)
+        cntErr = self.errorFrame.set_errors(diagnostics)
+        self.outputFrame.set_translationunit(tu, cursorTree)
+        for name, text, options in PARSE_MODES:
+            if name == self.parseMode:
+                self.outputFrame.set_parse_info('Mode: {0}, {1}'.format(text, timeInfo))
 
         if cntErr > 0:
             self.notebook.select(self.errorFrame)
@@ -1796,16 +4097,121 @@ def main():
     parser.add_argument('-l', '--libfile', help='select Clang library file', nargs=1, dest='libFile')
     parser.add_argument('file', help='''Text file containing input data,
                         1st line = file to parse,
-                        next lines = Clang arguments, one argument per line''',
+                        next lines = Clang arguments, one argument per line,
+                        or source file to parse if --build-dir is given''',
                         nargs='?')
+    parser.add_argument('-b', '--build-dir', help='''take file to parse and arguments from
+                        compile_commands.json in BUILDDIR, file selects the source file,
+                        without file it is selected in a window''', dest='buildDir')
+    parser.add_argument('-e', '--eager', help='''insert the whole AST in the tree view at once,
+                        default is to insert children when a node is opened''',
+                        action='store_true')
+    parser.add_argument('-d', '--dump', help='''do not open a window but write the AST of file
+                        as JSON Lines to stdout or OUTFILE''',
+                        action='store_true')
+    parser.add_argument('-o', '--output', help='output file for --dump', dest='outFile')
+    parser.add_argument('--max-depth', help='do not dump cursors deeper than DEPTH',
+                        type=int, dest='maxDepth', metavar='DEPTH')
+    parser.add_argument('--main-file-only', help='show or dump only cursors located in the parsed file',
+                        action='store_true', dest='mainFileOnly')
+    parser.add_argument('--include-path', help='''show or dump only cursors located in files matching
+                        the glob PATTERN, can be given several times''',
+                        action='append', dest='includePaths', metavar='PATTERN')
+    parser.add_argument('--exclude-path', help='''do not show or dump cursors located in files matching
+                        the glob PATTERN, can be given several times''',
+                        action='append', dest='excludePaths', metavar='PATTERN')
+    parser.add_argument('--attrs', help='''comma separated list of attributes to dump,
+                        default is all: {0}'''.format(','.join(DUMP_ATTRS.keys())))
+    parser.add_argument('--cache-dir', help='''directory to store parsed translation units,
+                        default is {0}'''.format(TranslationUnitCache.default_directory()),
+                        dest='cacheDir')
+    parser.add_argument('--cache-size', help='max size of cache directory in MB, default is {0}'.format(
+                        TranslationUnitCache._MAX_SIZE // (1024*1024)), type=int, dest='cacheSize')
+    parser.add_argument('--no-cache', help='do not use the cache directory', action='store_true',
+                        dest='noCache')
+    parser.add_argument('--clear-cache', help='remove all files from cache directory',
+                        action='store_true', dest='clearCache')
+    parser.add_argument('--metrics', help='''write time and counts of all phases of the last parse
+                        as JSON to METRICSFILE at exit''', dest='metricsFile')
+    parser.add_argument('--startup-profile', help='''write time needed for imports, first frame
+                        and loading libclang to stderr''', action='store_true', dest='startupProfile')
     args = parser.parse_args()
 
+    if args.startupProfile:
+        print_startup_time('imports', ' (import {0:.1f} ms)'.format((IMPORT_TIME - STARTUP_TIME) * 1000.0))
+
     if args.libFile:
         clang.cindex.Config.set_library_file(args.libFile[0])
 
-    app = Application(file=args.file)
+    tuCache = None
+    compileCommands = CompileCommandsCache()
+    if not args.noCache or args.clearCache:
+        cacheDir = args.cacheDir or TranslationUnitCache.default_directory()
+        if not args.noCache:
+            compileCommands = CompileCommandsCache(cacheDir)
+        cacheSize = None
+        if args.cacheSize is not None:
+            cacheSize = args.cacheSize * 1024 * 1024
+        tuCache = TranslationUnitCache(cacheDir, cacheSize)
+        if args.clearCache:
+            tuCache.clear()
+        if args.noCache:
+            tuCache = None
+
+    if args.dump:
+        if not args.file:
+            parser.error('--dump needs an input file')
+        attrs = None
+        if args.attrs:
+            attrs = args.attrs.split(',')
+            for attr in attrs:
+                if attr not in DUMP_ATTRS:
+                    parser.error(join('unknown attribute for --attrs: ', attr))
+        try:
+            clang.cindex.conf.lib   # load libclang now to report a missing library
+        except clang.cindex.LibclangError as e:
+            parser.error(xjoin('can not load libclang: ', e))
+        metrics.set_info('libclang', get_libclang_version())
+        pathFilter = PathFilter(args.mainFileOnly, args.includePaths, args.excludePaths)
+        if args.buildDir:
+            try:
+                commands = compileCommands.load(args.buildDir)
+            except (OSError, clang.cindex.CompilationDatabaseError) as e:
+                parser.error(xjoin('can not read compile commands: ', e))
+            idx = find_compile_command(commands, args.file)
+            if idx is None:
+                parser.error(join(args.file, ' not found in compile commands of ', args.buildDir))
+            inputFile = commands[idx] + (DEFAULT_PARSE_MODE,)
+        else:
+            try:
+                inputFile = read_input_file(args.file)
+            except (IOError, OSError, ValueError) as e:
+                parser.error(xjoin('can not read input file: ', e))
+        if not os.path.isfile(inputFile[0]):
+            parser.error(join('file to parse not found: ', inputFile[0]))
+        try:
+            if not args.outFile:
+                dump_ast(inputFile, sys.stdout, args.maxDepth, pathFilter, attrs)
+            else:
+                with open(args.outFile, 'w') as f:
+                    dump_ast(inputFile, f, args.maxDepth, pathFilter, attrs)
+        except (IOError, OSError) as e:
+            parser.error(xjoin('can not write output file: ', e))
+        except clang.cindex.TranslationUnitLoadError as e:
+            parser.error(xjoin('can not parse ', inputFile[0], ': ', e))
+        if args.metricsFile:
+            metrics.save(args.metricsFile)
+        return
+
+    pathFilter = PathFilter(args.mainFileOnly, args.includePaths, args.excludePaths)
+    app = Application(file=args.file, lazy=not args.eager, tuCache=tuCache, pathFilter=pathFilter,
+                      startupProfile=args.startupProfile, compileCommands=compileCommands,
+                      buildDir=args.buildDir)
     app.master.title('PyClASVi')
     app.mainloop()
+    if args.metricsFile:
+        app.update_counts()
+        metrics.save(args.metricsFile)
 
 if __name__ == '__main__':
   main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+
+"""
+Tests of PyClASVi parts not needing a window.
+
+Run them with 'python -m unittest discover tests' or 'python -m pytest tests'.
+libclang must be available, else all tests using it are skipped.
+"""
+
+import sys
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import clang.cindex
+import pyclasvi
+
+
+def libclang_available():
+    try:
+        clang.cindex.Index.create()
+        return True
+    except Exception:
+        return False
+
+HAVE_LIBCLANG = libclang_available()
+
+
+# Write files (name -> content) below directory.
+def write_files(directory, files):
+    for name, content in files.items():
+        path = os.path.join(directory, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(content)
+
+
+class InputFileTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='pyclasvi_test_')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_parse_mode(self):
+        write_files(self.directory, {'input.txt': 'main.cpp\n#parse-mode=declarations\n-xc++\n'})
+        self.assertEqual(pyclasvi.read_input_file(os.path.join(self.directory, 'input.txt')),
+                         ('main.cpp', ['-xc++'], 'declarations'))
+
+    def test_unknown_parse_mode(self):
+        write_files(self.directory, {'input.txt': 'main.cpp\n#parse-mode=fast\n-xc++\n'})
+        with self.assertRaises(ValueError):
+            pyclasvi.read_input_file(os.path.join(self.directory, 'input.txt'))
+
+
+@unittest.skipUnless(HAVE_LIBCLANG, 'libclang not available')
+class CompileCommandsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='pyclasvi_test_')
+        write_files(self.directory, {
+            'inc/foo.h': 'struct Foo { int x; };\n',
+            'src/main.cpp': '#include "foo.h"\nint main() { Foo f; return f.x; }\n',
+            })
+        self.buildDir = os.path.join(self.directory, 'build')
+        os.makedirs(self.buildDir)
+        with open(os.path.join(self.buildDir, 'compile_commands.json'), 'w') as f:
+            json.dump([{'directory': self.directory,
+                        'file': 'src/main.cpp',
+                        'arguments': ['c++', '-Iinc', '-std=c++11', '-c', 'src/main.cpp',
+                                      '-o', 'main.o']}], f)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_relative_include_dir(self):
+        commands = pyclasvi.CompileCommandsCache().load(self.buildDir)
+        self.assertEqual(len(commands), 1)
+        fileName, args = commands[0]
+        self.assertEqual(fileName, os.path.join(self.directory, 'src', 'main.cpp'))
+        self.assertIn('-I' + os.path.join(self.directory, 'inc'), args)
+
+        tu = clang.cindex.Index.create().parse(fileName, args=args)
+        includes = [pyclasvi.toStr(include.include.name) for include in tu.get_includes()]
+        self.assertEqual(len(includes), 1)
+        self.assertTrue(os.path.exists(includes[0]), includes[0])
+
+        tuCache = pyclasvi.TranslationUnitCache(os.path.join(self.directory, 'cache'))
+        self.assertTrue(tuCache.store(tu, fileName, args))
+
+    def test_find_compile_command(self):
+        commands = pyclasvi.CompileCommandsCache().load(self.buildDir)
+        self.assertEqual(pyclasvi.find_compile_command(commands, 'src/main.cpp'), 0)
+        self.assertIsNone(pyclasvi.find_compile_command(commands, 'other.cpp'))
+
+
+@unittest.skipUnless(HAVE_LIBCLANG, 'libclang not available')
+class TranslationUnitCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='pyclasvi_test_')
+        write_files(self.directory, {'main.c': 'int main(void) { return 0; }\n'})
+        self.fileName = os.path.join(self.directory, 'main.c')
+        self.index = clang.cindex.Index.create()
+        self.tu = self.index.parse(self.fileName)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_store_and_load(self):
+        tuCache = pyclasvi.TranslationUnitCache(os.path.join(self.directory, 'cache'))
+        self.assertTrue(tuCache.store(self.tu, self.fileName, []))
+        self.assertIsNotNone(tuCache.load(self.index, self.fileName, []))
+
+    def test_store_bigger_than_cache(self):
+        tuCache = pyclasvi.TranslationUnitCache(os.path.join(self.directory, 'cache'), 1)
+        self.assertFalse(tuCache.store(self.tu, self.fileName, []))
+        self.assertIsNone(tuCache.load(self.index, self.fileName, []))
+
+
+# Source with doubles: declarations found below several variables, also nested.
+DOUBLES_SOURCE = '''
+struct Outer {
+    struct Inner { int value; int get() const { return value; } } i1, i2;
+    int value;
+} o1, o2, o3;
+enum Color { RED, GREEN } c1, c2;
+int value(Outer o) { struct Local { int value; } l1, l2; return o.i1.value + l1.value; }
+'''
+
+
+@unittest.skipUnless(HAVE_LIBCLANG, 'libclang not available')
+class CursorTreeDoublesTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='pyclasvi_test_')
+        write_files(self.directory, {'doubles.cpp': DOUBLES_SOURCE})
+        self.tu = clang.cindex.Index.create().parse(os.path.join(self.directory, 'doubles.cpp'),
+                                                     args=['-xc++'])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    # Return IIDs of the whole tree in AST order, all shared children are copied.
+    @staticmethod
+    def get_all_iids(cursorTree):
+        iids = []
+        stack = ['0']
+        while stack:
+            iid = stack.pop()
+            iids.append(iid)
+            stack.extend(reversed(cursorTree.get_child_iids(iid)))
+        return iids
+
+    def test_shared_children(self):
+        cursorTree = pyclasvi.CursorTree()
+        cursorTree.walk(self.tu)
+        self.assertTrue(cursorTree.cntShared > 0)
+        expected = [(cursor.kind.value, pyclasvi.toStr(cursor.spelling), deep)
+                    for cursor, deep, curId, parentId in pyclasvi.iter_cursors(self.tu.cursor)]
+        result = [(cursorTree.kindIds[int(iid)], cursorTree.spellings[cursorTree.spellingIds[int(iid)]],
+                   cursorTree.depths[int(iid)]) for iid in self.get_all_iids(cursorTree)]
+        self.assertEqual(result, expected)
+
+    def test_search_finds_shared_children(self):
+        cursors = [(pyclasvi.toStr(cursor.spelling), cursor.kind.name)
+                   for cursor, deep, curId, parentId in pyclasvi.iter_cursors(self.tu.cursor)]
+        for spelling, cursorKind in (('value', None), ('value', 'FIELD_DECL'), ('get', None),
+                                     ('RED', None), ('Inner', 'STRUCT_DECL')):
+            cursorTree = pyclasvi.CursorTree()
+            cursorTree.walk(self.tu)
+            found = cursorTree.search(spelling, cursorKind=cursorKind)
+            positions = self.get_all_iids(cursorTree)
+            result = [positions.index(iid) for iid in found]
+            expected = [curId for curId, (curSpelling, kind) in enumerate(cursors)
+                        if (curSpelling == spelling) and (cursorKind in (None, kind))]
+            self.assertEqual(result, expected, (spelling, cursorKind))
+
+    def test_doubles_of_shared_children(self):
+        cursors = [cursor for cursor, deep, curId, parentId in pyclasvi.iter_cursors(self.tu.cursor)]
+        expected = [[pos for pos, other in enumerate(cursors) if other == cursor] for cursor in cursors]
+        cursorTree = pyclasvi.CursorTree()
+        cursorTree.walk(self.tu)
+        self.assertEqual(cursorTree.cntCursors, len(cursors))
+        self.assertEqual(cursorTree.cntDouble, sum(len(doubles) - 1 for pos, doubles in enumerate(expected)
+                                                   if doubles[0] == pos))
+        # ask for doubles of walked nodes before any shared children are opened
+        walked = len(cursorTree.parents)
+        found = {}
+        for iid in reversed(range(walked)):
+            doubles = cursorTree.get_double_iids(str(iid))
+            found[str(iid)] = doubles if isinstance(doubles, list) else [doubles]
+        positions = self.get_all_iids(cursorTree)
+        for iid, doubles in found.items():
+            self.assertEqual([positions.index(double) for double in doubles],
+                             expected[positions.index(iid)], iid)
+
+
+@unittest.skipUnless(HAVE_LIBCLANG, 'libclang not available')
+class DumpTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='pyclasvi_test_')
+        write_files(self.directory, {
+            'inc/foo.h': 'struct Foo { int x; };\n',
+            'main.cpp': '#include "foo.h"\nint main() { Foo f; return f.x; }\n',
+            })
+        self.inputFile = (os.path.join(self.directory, 'main.cpp'),
+                          ['-I' + os.path.join(self.directory, 'inc')], pyclasvi.DEFAULT_PARSE_MODE)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    # Return spellings of all dumped STRUCT_DECL and FUNCTION_DECL cursors.
+    def dump_decls(self, pathFilter):
+        outPath = os.path.join(self.directory, 'dump.jsonl')
+        with open(outPath, 'w') as outFile:
+            pyclasvi.dump_ast(self.inputFile, outFile, pathFilter=pathFilter, attrs=['kind', 'spelling'])
+        with open(outPath, 'r') as outFile:
+            lines = [json.loads(line) for line in outFile]
+        return [line['spelling'] for line in lines if line['kind'] in ('STRUCT_DECL', 'FUNCTION_DECL')]
+
+    def test_path_filter(self):
+        self.assertEqual(self.dump_decls(None), ['Foo', 'main'])
+        self.assertEqual(self.dump_decls(pyclasvi.PathFilter(mainFileOnly=True)), ['main'])
+        self.assertEqual(self.dump_decls(pyclasvi.PathFilter(includes=['*.h'])), ['Foo'])
+        self.assertEqual(self.dump_decls(pyclasvi.PathFilter(excludes=['*/inc/*'])), ['main'])
+
+
+@unittest.skipUnless(HAVE_LIBCLANG, 'libclang not available')
+class TokenTableTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='pyclasvi_test_')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_file_changed_after_parse(self):
+        fileName = os.path.join(self.directory, 'tokens.c')
+        write_files(self.directory, {'tokens.c': 'int value = 12345'})
+        tu = clang.cindex.Index.create().parse(fileName)
+        os.remove(fileName)
+        tokenTable = pyclasvi.TokenTable(tu, fileName)
+        self.assertEqual([tokenTable.get_kind(idx).name for idx in range(len(tokenTable))],
+                         ['KEYWORD', 'IDENTIFIER', 'PUNCTUATION', 'LITERAL'])
+        self.assertEqual(tokenTable.get_range(3), ((1, 13), (1, 18)))
+
+
+@unittest.skipUnless(HAVE_LIBCLANG, 'libclang not available')
+class FileContentTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='pyclasvi_test_')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_index_of_non_ascii_line(self):
+        fileName = os.path.join(self.directory, 'utf8.c')
+        with open(fileName, 'wb') as f:
+            f.write(b'const char *s = "\xc3\xa4\xc3\xb6\xe2\x82\xac"; int value;\n')
+        tu = clang.cindex.Index.create().parse(fileName)
+        cursor = [c for c in tu.cursor.get_children() if c.spelling == 'value'][0]
+        content = pyclasvi.FileContentCache().get(fileName)
+        line, column = content.get_index(cursor.location.line, cursor.location.column).split('.')
+        lineText = content.text.split('\n')[int(line) - 1]
+        self.assertTrue(lineText[int(column):].startswith('value'), lineText[int(column):])
+
+
+if __name__ == '__main__':
+    unittest.main()